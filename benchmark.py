@@ -0,0 +1,267 @@
+### Benchmarks for the release note checks in script.py
+### Usage - python benchmark.py generate corpus/ --files 500 --size 20000
+###       - python benchmark.py run corpus/ --save-baseline baseline.json
+###       - python benchmark.py run corpus/ --compare baseline.json   (exits with 1 on a regression)
+###       - python benchmark.py startup --check                      (exits with 1 when a cold start is over its target)
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+import script
+
+# Scanning paths that can be measured, each one is run in its own process so peak memory is per path
+BENCH_PATHS = ['find_states', 'scan_file', 'scan_file_mmap', 'drop_to_verdict']
+
+# Cold start targets in milliseconds: importing script (what batch mode and the GUI both pay), the batch entry point end to end,
+# and the imports the GUI adds on top (tkinter and tkinterdnd2)
+STARTUP_TARGETS_MS = {'import_script': 40, 'scan_cli_help': 150, 'gui_imports': 150}
+
+HEADER_STYLES = {
+    'colon': "Version: {version} {date}",
+    'upper': "VERSION:{version} - {date}",
+    'separate': "Version: {version}\nReleased {date}",
+    'missing': "Release {version} ({date})",
+}
+ENCODINGS = ['utf-8', 'utf-8-sig', 'cp1252', 'utf-16']
+FILLER_WORDS = ("fixed updated removed added issue module config report build service timeout user login "
+                "payment batch export import screen field error message validation release patch café naïve — “quoted”").split()
+
+# One release note with the given number of bytes (roughly), state mentions, CIVID lines and dash notes
+def generate_release_note(rng, state_data, size, density, civid_rate, dash_rate, header_style, version, sections):
+    released = datetime.now() - timedelta(days=rng.randint(0, 60))
+    date = rng.choice([f"{released.month}/{released.day}/{released.year % 100:02d}", released.strftime('%m/%d/%Y')])
+    lines = ["Release Notes", "=============", HEADER_STYLES[header_style].format(version=version, date=date), ""]
+    length = sum(len(line) + 1 for line in lines)
+    section_size = max(1, size // max(1, sections))
+    while length < size:
+        if civid_rate and rng.random() < civid_rate:
+            line = f"CIVID-{rng.randint(1000, 99999)} {rng.choice(state_data)[0]} {' '.join(rng.choices(FILLER_WORDS, k=6))}"
+        elif dash_rate and rng.random() < dash_rate:
+            line = f"- note: {rng.choice(state_data)[1]} {' '.join(rng.choices(FILLER_WORDS, k=5))}"
+        else:
+            words = rng.choices(FILLER_WORDS, k=rng.randint(4, 14))
+            if density and rng.random() < density:
+                abbrev, name = rng.choice(state_data)
+                words.insert(rng.randrange(len(words) + 1), rng.choice([abbrev, name, name.upper()]))
+            line = ' '.join(words)
+        lines.append(line)
+        length += len(line) + 1
+        # Older history of a cumulative release note
+        if sections > 1 and length // section_size > (length - len(line) - 1) // section_size:
+            lines.append(rng.choice(['-' * 40, '=' * 40]))
+            lines.append(f"Version: 1.0.0.{rng.randint(0, 99)} 1/1/20")
+    return '\n'.join(lines) + '\n'
+
+# Write a reproducible corpus and a manifest of how it was made
+def generate_corpus(args):
+    rng = random.Random(args.seed)
+    state_data = script.load_states()
+    os.makedirs(args.output, exist_ok=True)
+    for index in range(args.files):
+        version = f"{rng.randint(1, 9)}.{rng.randint(0, 20)}.{rng.randint(0, 99)}.{rng.randint(0, 999)}"
+        header_style = rng.choice(list(HEADER_STYLES)) if args.header_style == 'mixed' else args.header_style
+        encoding = rng.choice(ENCODINGS) if args.encoding == 'mixed' else args.encoding
+        text = generate_release_note(rng, state_data, args.size, args.density, args.civid, args.dash_notes, header_style, version, args.sections)
+        with open(os.path.join(args.output, f"release_notes_{index:05d}_{version}.txt"), 'w', encoding=encoding, errors='replace') as file:
+            file.write(text)
+
+    with open(os.path.join(args.output, 'manifest.json'), 'w') as file:
+        json.dump({key: value for key, value in vars(args).items() if key != 'func'}, file, indent=2)
+    print(f"Wrote {args.files} files to {args.output}")
+
+# Files of a corpus directory
+def corpus_files(corpus):
+    return sorted(os.path.join(corpus, name) for name in os.listdir(corpus) if name.endswith('.txt'))
+
+# Peak resident memory of this process in MB, None where the resource module doesn't exist (Windows)
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+# Value at a percentile of a sorted list
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+# Time one scanning path over every file of the corpus, run in a child process
+def measure_path(path_name, corpus, state, repeat):
+    script.state_data = script.load_states()
+    script.selected_state = state
+    # The on-disk scan index would turn every round after the first into lookups
+    script.scan_index_path = None
+    files = corpus_files(corpus)
+    total_bytes = sum(os.path.getsize(file_path) for file_path in files)
+    matcher = script.all_states_matcher()
+    state_abbreviations = {abbrev for abbrev, name in script.state_data if name != state}
+    state_names = {name for abbrev, name in script.state_data if name != state}
+
+    if path_name == 'find_states':
+        # The original two reads per file
+        scan = lambda file_path: (script.find_states(file_path, state_abbreviations, state_names), script.extract_version_and_date_from_file(file_path))
+    elif path_name == 'scan_file':
+        script.MMAP_SCAN_THRESHOLD = float('inf')
+        scan = lambda file_path: script.scan_file(file_path, matcher, script.scan_section_limit())
+    elif path_name == 'scan_file_mmap':
+        scan = lambda file_path: script.scan_file_mmap(file_path, matcher, script.scan_section_limit())
+    else:
+        # What happens between a drop and the row turning red or green, without the widgets
+        def scan(file_path):
+            result = script.cached_scan_file(file_path)
+            return script.check_file(os.path.basename(file_path), result, state), script.state_findings(result, state)
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        # Cold cache on every round
+        script.scan_cache.clear()
+        script.scan_cache_keys.clear()
+        script.scan_cache_bytes = 0
+        for file_path in files:
+            file_started = time.perf_counter()
+            scan(file_path)
+            latencies.append(time.perf_counter() - file_started)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'files': len(files) * repeat,
+        'seconds': round(elapsed, 4),
+        'files_per_sec': round(len(files) * repeat / elapsed, 1),
+        'mb_per_sec': round(total_bytes * repeat / elapsed / (1024 * 1024), 2),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+# Cumulative import time in ms of every module a snippet imports, from python -X importtime. None if the snippet fails
+def import_times(code):
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+    if completed.returncode != 0:
+        return None
+    times = {}
+    for line in completed.stderr.splitlines():
+        fields = line.split('|')
+        if line.startswith('import time:') and len(fields) == 3 and fields[1].strip().isdigit():
+            times[fields[2].strip()] = int(fields[1]) / 1000
+    return times
+
+# Measure cold starts in fresh interpreters, best of several runs, and check them against STARTUP_TARGETS_MS
+def measure_startup(args):
+    script_path = os.path.abspath(script.__file__)
+    # One run first so the measured ones load compiled bytecode like a normal launch
+    import_times('import script')
+
+    results = {}
+    runs = [import_times('import script') for _ in range(args.repeat)]
+    results['import_script'] = min(times['script'] for times in runs)
+
+    durations = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, script_path, 'scan', '--help'], check=True, capture_output=True)
+        durations.append((time.perf_counter() - started) * 1000)
+    results['scan_cli_help'] = min(durations)
+
+    gui_runs = [import_times('import tkinter, tkinter.ttk, tkinter.filedialog, tkinter.messagebox, tkinterdnd2') for _ in range(args.repeat)]
+    if None in gui_runs:
+        results['gui_imports'] = None
+    else:
+        results['gui_imports'] = min(times['tkinter'] + times['tkinter.ttk'] + times['tkinter.filedialog'] + times['tkinter.messagebox'] + times['tkinterdnd2'] for times in gui_runs)
+
+    failed = False
+    for name, target in STARTUP_TARGETS_MS.items():
+        value = results[name]
+        if value is None:
+            print(f"{name:16} {'-':>9}    target {target} ms  (couldn't import, is tkinterdnd2 installed?)")
+            continue
+        over = value > target
+        failed = failed or over
+        print(f"{name:16} {value:>9.1f} ms target {target} ms{'  OVER' if over else ''}")
+    return 1 if args.check and failed else 0
+
+# Run every requested path in a fresh interpreter and report, save or compare the numbers
+def run_benchmarks(args):
+    results = {}
+    for path_name in args.paths.split(','):
+        if path_name not in BENCH_PATHS:
+            sys.exit(f"Unknown path '{path_name}', choose from {', '.join(BENCH_PATHS)}")
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '_measure', path_name, args.corpus, '--state', args.state, '--repeat', str(args.repeat)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results[path_name] = json.loads(output)
+        stats = results[path_name]
+        print(f"{path_name:16} {stats['files_per_sec']:>9} files/s {stats['mb_per_sec']:>8} MB/s  p50 {stats['p50_ms']:>8} ms  p99 {stats['p99_ms']:>8} ms  peak RSS {stats['peak_rss_mb']} MB")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as file:
+            json.dump({'corpus': os.path.abspath(args.corpus), 'created': datetime.now().isoformat(timespec='seconds'), 'results': results}, file, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)['results']
+        regressions = []
+        for path_name, stats in results.items():
+            if path_name not in baseline:
+                continue
+            change = stats['files_per_sec'] / baseline[path_name]['files_per_sec'] - 1
+            print(f"{path_name:16} {change:+.1%} files/s against baseline")
+            if change < -args.tolerance:
+                regressions.append(path_name)
+        if regressions:
+            print(f"Regression in: {', '.join(regressions)}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the release note checks on a synthetic corpus.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help="write a synthetic release note corpus")
+    generate.add_argument('output')
+    generate.add_argument('--files', type=int, default=200)
+    generate.add_argument('--size', type=int, default=20000, help="approximate bytes per file")
+    generate.add_argument('--density', type=float, default=0.01, help="fraction of lines mentioning a state")
+    generate.add_argument('--civid', type=float, default=0.05, help="fraction of CIVID ticket lines")
+    generate.add_argument('--dash-notes', type=float, default=0.05, help="fraction of lines that are '-' notes")
+    generate.add_argument('--sections', type=int, default=1, help="number of release note sections per file")
+    generate.add_argument('--header-style', choices=list(HEADER_STYLES) + ['mixed'], default='colon')
+    generate.add_argument('--encoding', choices=ENCODINGS + ['mixed'], default='utf-8')
+    generate.add_argument('--seed', type=int, default=1)
+    generate.set_defaults(func=generate_corpus)
+
+    run = commands.add_parser('run', help="measure each scanning path on a corpus")
+    run.add_argument('corpus')
+    run.add_argument('--paths', default=','.join(BENCH_PATHS), help="comma separated, from: " + ', '.join(BENCH_PATHS))
+    run.add_argument('--state', default='Illinois')
+    run.add_argument('--repeat', type=int, default=3, help="passes over the corpus, more passes give steadier numbers (default: 3)")
+    run.add_argument('--save-baseline', metavar='FILE')
+    run.add_argument('--compare', metavar='FILE')
+    run.add_argument('--tolerance', type=float, default=0.2, help="allowed drop in files/s before --compare fails (default: 0.2)")
+    run.set_defaults(func=run_benchmarks)
+
+    startup = commands.add_parser('startup', help="measure cold start times with -X importtime")
+    startup.add_argument('--repeat', type=int, default=5, help="runs of each measurement, the best one counts (default: 5)")
+    startup.add_argument('--check', action='store_true', help="exit with 1 if a target is missed or a lazy module is imported up front")
+    startup.set_defaults(func=measure_startup)
+
+    measure = commands.add_parser('_measure')
+    measure.add_argument('path_name')
+    measure.add_argument('corpus')
+    measure.add_argument('--state', default='Illinois')
+    measure.add_argument('--repeat', type=int, default=1)
+    measure.set_defaults(func=lambda args: print(json.dumps(measure_path(args.path_name, args.corpus, args.state, args.repeat))))
+
+    args = parser.parse_args()
+    sys.exit(args.func(args) or 0)
@@ -1,19 +1,252 @@
 ### Created by James Yi
-### TODO - Link application to artifactory, need to use their APIs
-###      - Make application work with fortify scans as well. Shouldn't be difficult, use pypdf pymupdf
-###      - Stop reading file after most recent section of release note - generally denoted by a line of - or =
 ### Note - Drag n drop breaks sometimes with file directories that contain spaces, still need to figure out a way to fix
 ###      - Release note formats vary from state to state so some states may get flagged alot, such as NJ RT
 
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
+# Modules that only some features need (uploads, export, archives, the index, profiling, the file watcher, batch mode)
+# are imported in the functions that use them, so the window comes up without loading them
 import re
-from tkinterdnd2 import DND_FILES, TkinterDnD
 import os
-import shutil
+import io
+import sys
+import mmap
+import bisect
+import contextlib
+import hashlib
+import time
+import queue
+import select
+import struct
+import threading
+import argparse
+import fnmatch
+import itertools
+import json
+from collections import Counter, OrderedDict, deque, namedtuple
 from datetime import datetime, timedelta
+from functools import lru_cache
+
+VERSION_PATTERN = re.compile(r'version:\s*([^\s]+)', re.IGNORECASE)
+DATE_PATTERN = re.compile(r'\b\d{1,2}/\d{1,2}/(\d{2}|\d{4})\b')
+DATE_FORMATS = ('%m/%d/%Y', '%m/%d/%y')
+
+# Byte versions for the memory-mapped scanner, written so they never run past the end of a line
+BYTE_VERSION_PATTERN = re.compile(rb'version:[^\S\n]*([^\s]+)', re.IGNORECASE)
+# Whitespace other than a newline as the str patterns see it, ASCII plus the UTF-8 encodings of the Unicode spaces
+BYTE_SPACE = rb'(?:[^\S\n]|[\x1c-\x1f]|\xc2[\x85\xa0]|\xe1\x9a\x80|\xe2\x80[\x80-\x8a\xa8\xa9\xaf]|\xe2\x81\x9f|\xe3\x80\x80)'
+BYTE_SECTION_BOUNDARY_PATTERN = re.compile(rb'^' + BYTE_SPACE + rb'*(?:-{3,}|={3,})' + BYTE_SPACE + rb'*$', re.MULTILINE)
+# What every section boundary line has in it. The regex engine can skip ahead to these, but not to the line starts the pattern above needs
+BYTE_SECTION_RULE_PATTERN = re.compile(rb'---|===')
+BYTE_TEXT_PATTERN = re.compile(rb'\S')
+# The memory-mapped scanner lowercases this much of the file at a time, cut at line ends, to look for full state names
+BYTE_NAME_CHUNK_SIZE = 1024 * 1024
+# Uppercase ASCII to lowercase, the same folding bytes.lower() does
+ASCII_LOWERCASE = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+
+# Files at least this big are memory-mapped and scanned as bytes instead of being decoded line by line
+MMAP_SCAN_THRESHOLD = 16 * 1024 * 1024
+
+# Release notes inside archives are listed as bundle.zip!/path/notes_1.2.3.4.txt and read straight out of the archive
+ARCHIVE_SEPARATOR = '!/'
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz')
+ARCHIVE_MEMBER_PATTERN = '*.txt'
+
+# Files are read in blocks of this size, and the line number and byte offset where each block starts are kept as a sparse line index
+LINE_INDEX_BLOCK_SIZE = 64 * 1024
+
+# Compiled patterns for a list of (abbreviation, name) states, as str and as bytes, with the index of each state by word
+StateMatcher = namedtuple('StateMatcher', ['states', 'abbreviations', 'names', 'abbreviation_index', 'name_index', 'byte_abbreviations', 'byte_names'])
+
+# A line mentioning at least one state, with the indexes of the states found as abbreviations and as full names
+StateHit = namedtuple('StateHit', ['line_number', 'text', 'section', 'abbreviations', 'names', 'extra_sections'], defaults=((),))
+
+# Everything learned about a file from a single read. Files are scanned against every state at once,
+# section_masks has a bit per state (in state_data order) for each release note section so picking a state is a bitmask check
+# line_index is the LineIndex built while reading the file, if the scan read it. extra_headers holds (version, date) for the
+# header patterns of the rule profile after the first, used by states with their own version/date formats
+ScanResult = namedtuple('ScanResult', ['hits', 'section_masks', 'version', 'date', 'line_count', 'date_obj', 'error', 'line_index', 'extra_headers', 'extra_section_masks'], defaults=(None, None, (), ()))
+
+# Line numbers and the byte offsets where they start, in ascending order, so a line can be reached without reading the file up to it
+LineIndex = namedtuple('LineIndex', ['line_numbers', 'offsets'])
+
+# A rule profile compiled into a scan loop, with the version/date patterns it extracts and the rules for each state
+RuleProfile = namedtuple('RuleProfile', ['fingerprint', 'scan_lines', 'skip_line', 'headers', 'byte_headers', 'default', 'states'])
+
+# Checks for one state. header is the index of its version/date patterns in RuleProfile.headers, skip matches the lines it
+# ignores on top of the profile's skip patterns, and allowed holds the abbreviations and names it may mention
+StateRules = namedtuple('StateRules', ['section_limit', 'max_date_range', 'header', 'skip', 'allowed', 'date_formats'])
+
+# Scan results are cached by path, modification time and size
+SCAN_CACHE_MAX_ENTRIES = 4096
+SCAN_CACHE_MAX_BYTES = 64 * 1024 * 1024
+scan_cache = OrderedDict()
+scan_cache_keys = {}
+scan_cache_bytes = 0
+scan_cache_stats = {'hits': 0, 'misses': 0, 'index_hits': 0}
+scan_cache_lock = threading.Lock()
+# Content hashes of listed files under the same keys, so a file dropped again unchanged isn't read to hash it. Also under scan_cache_lock
+content_digests = OrderedDict()
+
+# Scan results also go into an SQLite index on disk, keyed by a hash of the file content and a fingerprint of the scan rules,
+# so a file seen in an earlier session (under any name) isn't scanned again. RELEASE_NOTES_INDEX or --index can point several
+# users at one shared index file, an empty value turns it off. Past SCAN_INDEX_MAX_BYTES the least recently used results go
+SCAN_INDEX_PATH = os.environ.get('RELEASE_NOTES_INDEX', os.path.join(os.path.expanduser('~'), '.release_notes_index.sqlite'))
+SCAN_INDEX_MAX_BYTES = 256 * 1024 * 1024
+SCAN_INDEX_EVICT_EVERY = 200
+SCAN_INDEX_TIMEOUT = 10
+# Bump when a change to the scanner changes what it finds, so old index entries stop matching
+SCAN_RULES_VERSION = 5
+scan_index_path = SCAN_INDEX_PATH or None
+scan_index_connections = threading.local()
+scan_index_writes = itertools.count(1)
+
+# Fortify reports and other PDFs are read with PyMuPDF or pypdf, whichever is installed. Pages are extracted in batches,
+# batches after the first are spread over a process pool and only extracted as far as the scan reads. 0 workers extracts in the calling thread
+PDF_EXTENSIONS = ('.pdf',)
+PDF_PAGES_PER_TASK = 8
+PDF_PAGE_WORKERS = min(4, os.cpu_count() or 1)
+pdf_executor = None
+pdf_lock = threading.Lock()
+
+# Extracted page text is cached by content hash of the document, so a renamed or copied report isn't extracted again
+PDF_TEXT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+pdf_text_cache = OrderedDict()
+pdf_text_cache_bytes = 0
+pdf_text_cache_lock = threading.Lock()
+
+# Files are scanned on a thread pool so the window stays responsive, results reach the Tk thread through ui_queue
+SCAN_WORKERS = min(8, os.cpu_count() or 1)
+SCANNING_COLOR = 'blue'
+UI_POLL_MS = 50
+scan_executor = None
+scan_generation = 0
+pending_scans = set()
+ui_queue = queue.Queue()
+# Archive members read ahead of the scanners, so a big archive isn't pulled into memory all at once
+ARCHIVE_READ_AHEAD = 2 * SCAN_WORKERS
+
+# The findings viewer lists this many findings a page and shows this many lines either side of the one clicked
+FINDINGS_PAGE_SIZE = 200
+FINDING_CONTEXT_LINES = 5
+# How far back to read for the lines before an indexed line, when the index has no line before them
+CONTEXT_READ_BEHIND = 64 * 1024
+
+# Listed files are watched so edits made while the app is open are picked up. On Linux inotify watches the folders of the
+# listed files, elsewhere (or if a folder can't be watched) the files are polled. Changes are gathered until WATCH_DEBOUNCE seconds go quiet
+WATCH_DEBOUNCE = 0.3
+WATCH_POLL_SECONDS = 2.0
+IN_ATTRIB, IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x4, 0x8, 0x40, 0x80, 0x100, 0x200
+IN_Q_OVERFLOW, IN_IGNORED = 0x4000, 0x8000
+WATCH_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+INOTIFY_EVENT = struct.Struct('iIII')
+inotify_libc = None
+inotify_fd = None
+# Files on disk and the listed entries that come from each (the file itself, or the members of an archive)
+watched_files = {}
+watch_descriptors = {}
+watch_folders = {}
+watch_folder_counts = Counter()
+polled_files = {}
+watch_lock = threading.Lock()
+
+# Files in the list keyed by full path with their colour and latest scan result, and how many files have each colour
+file_entries = {}
+file_results = {}
+color_counts = Counter()
+
+# Listed files grouped by content hash so copies of a release note are scanned once, with the number shown for each group of copies
+content_groups = {}
+entry_digests = {}
+content_group_numbers = {}
+content_group_counter = itertools.count(1)
+# The generation in which a copy of each content was claimed for scanning, used from the scan threads
+content_scans = {}
+content_scans_lock = threading.Lock()
+STATUS_TEXT = {SCANNING_COLOR: "Scanning", 'red': "Failed", 'green': "OK", 'orange': "Ignored"}
+
+# Artifactory settings come from the environment so no credentials live in the script.
+# ARTIFACTORY_URL is the base URL, e.g. https://artifactory.example.com/artifactory
+ARTIFACTORY_URL = os.environ.get('ARTIFACTORY_URL', '')
+ARTIFACTORY_REPO = os.environ.get('ARTIFACTORY_REPO', 'release-notes')
+ARTIFACTORY_TOKEN = os.environ.get('ARTIFACTORY_TOKEN', '')
+UPLOAD_WORKERS = 4
+UPLOAD_RETRIES = 3
+UPLOAD_BACKOFF = 1.0
+UPLOAD_TIMEOUT = 60
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+upload_executor = None
+upload_connections = threading.local()
+upload_outcomes = {}
+upload_errors = []
+uploads_pending = 0
+upload_mgmt = ''
+
+# Local export copies files this many at a time
+EXPORT_WORKERS = 8
+EXPORT_CHUNK_SIZE = 1024 * 1024
+
+# Scan daemon (python script.py serve), keeps the states, matcher and scan results warm between requests from hooks and build steps
+SERVE_HOST = '127.0.0.1'
+SERVE_PORT = 8767
+SERVE_MAX_REQUESTS = 4
+SERVE_QUEUE_TIMEOUT = 30
+SERVE_READ_AHEAD = 2 * SCAN_WORKERS
+serve_slots = None
+serve_max_requests = SERVE_MAX_REQUESTS
+serve_reload_lock = threading.Lock()
+served_state_files = None
+serve_counters = Counter()
+
+# Opt-in timing of each scan and UI stage, switched on with --stats. --profile also runs cProfile and writes a JSON trace
+STAGES = ('hash', 'read', 'version_date', 'abbreviations', 'names', 'pdf_extract', 'verdict', 'widgets')
+SLOWEST_FILES_SHOWN = 20
+TRACE_MAX_EVENTS = 200000
+instrumentation_enabled = False
+profile_dir = None
+stage_totals = Counter()
+scan_counters = Counter()
+file_timings = {}
+trace_events = []
+profilers = []
+scan_stats = threading.local()
+stats_lock = threading.Lock()
+trace_origin = time.perf_counter()
+
+# State lists live next to the script so batch mode works from any directory
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_ABBREVIATION_FILE = os.path.join(SCRIPT_DIR, "us-states-abbreviation.txt")
+STATE_NAME_FILE = os.path.join(SCRIPT_DIR, "us-states.txt")
+# The same list as a Python module with the matcher patterns prebuilt, regenerated with: python script.py build-state-table
+STATE_TABLE_FILE = os.path.join(SCRIPT_DIR, "state_table.py")
+state_table_cache = None
+
+# A line of only - or = ends a release note section. Scanning stops after this many sections following the version header, 0 reads the whole file
+SECTION_BOUNDARY_PATTERN = re.compile(r'^\s*(?:-{3,}|={3,})\s*$')
+DEFAULT_SECTION_LIMIT = 1
+# Section limits given on the command line, these win over the rule profile
+SECTION_LIMITS = {}
 
 MAX_DATE_RANGE = 1000; # Maximum date from today allowed. For example, if you want files within 30 days only, then set it to 30
+
+# Rule profile, a JSON file overriding any of DEFAULT_RULES. Skip patterns are searched in each line with surrounding whitespace
+# stripped, plain text and ^text patterns are checked without a regex. States can have their own skip patterns, allowed mentions
+# of other states, version/date patterns with the strptime formats of their dates, sections and date range, for formats that
+# get flagged a lot such as NJ RT:
+#   {"states": {"New Jersey": {"skip": ["\\bRT\\b"], "allowed": ["PA", "New York"], "sections": 2, "max_date_range": 30}}}
+RULES_FILE = os.environ.get('RELEASE_NOTES_RULES', os.path.join(SCRIPT_DIR, "rules.json"))
+DEFAULT_RULES = {
+    'skip': ['CIVID', '^-'],
+    'version': VERSION_PATTERN.pattern,
+    'date': DATE_PATTERN.pattern,
+    'date_formats': list(DATE_FORMATS),
+    'sections': DEFAULT_SECTION_LIMIT,
+    'max_date_range': MAX_DATE_RANGE,
+    'states': {},
+}
+STATE_RULE_KEYS = ('skip', 'allowed', 'version', 'date', 'date_formats', 'sections', 'max_date_range')
+REGEX_SPECIAL_CHARACTERS = set('.^$*+?{}[]\\|()')
+rules_path = RULES_FILE
+rule_profile = None
+compiled_rule_profiles = {}
 previous_state = None
 
 # Loads the state data and abbreviations
@@ -27,42 +260,179 @@ def load_state_data(abbreviation_file, name_file):
                 state_data.append((abbreviation, state_name))
         return state_data
     except FileNotFoundError as e:
-        print(f"Error: {e}")
+        sys.stderr.write(f"Error: {e}\n")
         return []
 
+# The generated state table module. It is imported the first time, and read again from source whenever build-state-table
+# rewrote it since, so a long running daemon doesn't keep the table it started with. The import's bytecode cache could be stale
+# for a table rewritten within the same second, so the source is executed directly instead of reloading the module
+def load_state_table():
+    global state_table_cache
+    table_time = os.stat(STATE_TABLE_FILE).st_mtime_ns
+    if state_table_cache is None:
+        import state_table
+    elif state_table_cache[0] != table_time:
+        import types
+        state_table = types.ModuleType('state_table')
+        with open(STATE_TABLE_FILE, 'r', encoding="utf8") as file:
+            exec(compile(file.read(), STATE_TABLE_FILE, 'exec'), vars(state_table))
+    else:
+        return state_table_cache[1]
+    state_table_cache = (table_time, state_table)
+    return state_table
+
+# State data from the generated state table, or from the text files when either was changed after the table was generated
+def load_states():
+    try:
+        table_time = os.stat(STATE_TABLE_FILE).st_mtime_ns
+        if all(os.stat(path).st_mtime_ns <= table_time for path in (STATE_ABBREVIATION_FILE, STATE_NAME_FILE)):
+            return list(load_state_table().STATES)
+    except (OSError, ImportError, SyntaxError):
+        pass
+    return load_state_data(STATE_ABBREVIATION_FILE, STATE_NAME_FILE)
+
+# Write the state table module from the text files, with the trie patterns build_state_matcher would make for them
+def build_state_table():
+    states = load_state_data(STATE_ABBREVIATION_FILE, STATE_NAME_FILE)
+    if not states:
+        return 1
+    lines = [
+        f'### Generated by "python script.py build-state-table" from {os.path.basename(STATE_ABBREVIATION_FILE)} and {os.path.basename(STATE_NAME_FILE)}, don\'t edit by hand.',
+        '### The text files are used instead whenever one of them is newer than this file',
+        '',
+        'STATES = (',
+        *[f'    ({abbrev!r}, {name!r}),' for abbrev, name in states],
+        ')',
+        '',
+        '# Trie alternations for build_state_matcher',
+        f'ABBREVIATION_PATTERN = {trie_pattern([abbrev for abbrev, _ in states])!r}',
+        f'NAME_PATTERN = {trie_pattern([name for _, name in states])!r}',
+    ]
+    with open(STATE_TABLE_FILE, 'w', encoding="utf8") as file:
+        file.write('\n'.join(lines) + '\n')
+    print(f"Wrote {len(states)} states to {STATE_TABLE_FILE}")
+    return 0
+
+# Prebuilt abbreviation and name alternations when the states are exactly the ones in the state table
+def prebuilt_patterns(states):
+    try:
+        state_table = load_state_table()
+    except (OSError, ImportError, SyntaxError):
+        return None, None
+    if states != state_table.STATES:
+        return None, None
+    return state_table.ABBREVIATION_PATTERN, state_table.NAME_PATTERN
+
+# Regex alternation for a list of words with shared prefixes factored out, e.g. North (?:Carolina|Dakota).
+# The regex engine then tries one branch per character instead of every word at every position
+def trie_pattern(words):
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def branches(node):
+        alternatives = [re.escape(char) + branches(child) for char, child in sorted(node.items()) if char]
+        if not alternatives:
+            return ''
+        # A word ending here is tried last so longer words win, e.g. "West Virginia" over "West"
+        if '' in node:
+            return '(?:' + '|'.join(alternatives) + ')?'
+        return alternatives[0] if len(alternatives) == 1 else '(?:' + '|'.join(alternatives) + ')'
+
+    return '(?:' + branches(trie) + ')'
+
+# Build one matcher for a list of states instead of running a separate regex for every state on every line.
+# Boundaries are the same as the old (^|[\s_])...($|[\s_]) patterns, written as lookarounds. Each match is zero-width with the word
+# captured, so overlapping names like "West Virginia" and "Virginia" are both found. The byte patterns are for the memory-mapped scanner.
+# Byte patterns can't tell Unicode spaces from other characters, so they only rule out ASCII next to a state and find candidate lines
+# that the memory-mapped scanner checks again with the str patterns. They consume what they match so the regex engine can skip ahead
+# to the characters a match can start with instead of trying a lookbehind at every byte: abbreviations start with the trie, which
+# only begins with uppercase letters, and names with the byte before them, matched on lowercased lines (see name_candidate_lines)
+@lru_cache(maxsize=16)
+def build_state_matcher(states):
+    def alternation(words, flags=0, prebuilt=None):
+        if not words:
+            return None
+        pattern = r'(?<![^\s_])(?=(' + (prebuilt or trie_pattern(words)) + r')(?![^\s_]))'
+        return re.compile(pattern, flags)
+
+    def byte_alternation(words, prebuilt=None, lowercase=False):
+        if not words:
+            return None
+        pattern = '(?:' + (prebuilt or trie_pattern(words)) + r')(?![\x21-\x5e\x60-\x7e])'
+        if lowercase:
+            pattern = r'[^\x21-\x5e\x60-\x7e]' + pattern.translate(ASCII_LOWERCASE)
+        return re.compile(pattern.encode('utf8'))
+
+    abbreviations = [abbrev for abbrev, _ in states if abbrev]
+    names = [name for _, name in states if name]
+    abbreviation_pattern, name_pattern = prebuilt_patterns(states)
+    return StateMatcher(
+        states,
+        alternation(abbreviations, prebuilt=abbreviation_pattern),
+        alternation(names, re.IGNORECASE, prebuilt=name_pattern),
+        {abbrev: index for index, (abbrev, _) in enumerate(states) if abbrev},
+        # Full names match case-insensitively
+        {name.lower(): index for index, (_, name) in enumerate(states) if name},
+        byte_alternation(abbreviations, prebuilt=abbreviation_pattern),
+        byte_alternation(names, prebuilt=name_pattern, lowercase=True),
+    )
+
+# Indexes of the states mentioned on a line, in the order they appear. Abbreviations are kept apart since they are reported first
+def line_hits(matcher, line):
+    abbreviations = matcher.abbreviations.findall(line) if matcher.abbreviations else ()
+    names = matcher.names.findall(line) if matcher.names else ()
+    # Most lines have no hits, only build the index tuples when something matched
+    abbreviations = tuple(matcher.abbreviation_index[abbrev] for abbrev in abbreviations) if abbreviations else ()
+    names = tuple(matcher.name_index[name.lower()] for name in names) if names else ()
+    return abbreviations, names
+
+# line_hits with the abbreviation and full name searches timed apart, for instrumented scans
+def timed_line_hits(matcher, line, stages, counters):
+    started = time.perf_counter()
+    abbreviations = matcher.abbreviations.findall(line) if matcher.abbreviations else ()
+    middle = time.perf_counter()
+    names = matcher.names.findall(line) if matcher.names else ()
+    stages['abbreviations'] += middle - started
+    stages['names'] += time.perf_counter() - middle
+    counters['regex_evaluations'] += bool(matcher.abbreviations) + bool(matcher.names)
+    abbreviations = tuple(matcher.abbreviation_index[abbrev] for abbrev in abbreviations) if abbreviations else ()
+    names = tuple(matcher.name_index[name.lower()] for name in names) if names else ()
+    return abbreviations, names
+
+# Describe the first state on a line that isn't in the excluded bitmask, abbreviations take priority over full state names
+def describe_hit(states, abbreviations, names, excluded=0):
+    for index in abbreviations:
+        if not excluded >> index & 1:
+            return f'Found Abbreviation: {states[index][0]}'
+    for index in names:
+        if not excluded >> index & 1:
+            return f'Found State Name: {states[index][1]}'
+    return None
+
 # Go through the file to check for certain requirements
 def find_states(filename, state_abbreviations, state_names):
     output = []
+    states = tuple((abbrev, None) for abbrev in sorted(state_abbreviations)) + tuple((None, name) for name in sorted(state_names))
+    matcher = build_state_matcher(states)
     try:
         with open(filename, 'r', encoding="utf8", errors='ignore') as file:
-            line_number = 1
-            for line in file:
+            for line_number, line in enumerate(file, 1):
                 # Ignore if it is a CIVID ticket
                 if "CIVID" in line:
-                    line_number += 1
                     continue
                 
                 # Ignore if line starts with "-": means it is a note and may contain flagged info
-                if line.strip().startswith("-"):
-                    line_number += 1
+                if line.lstrip().startswith("-"):
                     continue
                 
-                found = False
-                # Check for abbreviations with boundary conditions, case-insensitive
-                for abbreviation in state_abbreviations:
-                    if re.search(rf'(^|[\s_]){re.escape(abbreviation)}($|[\s_])', line):
-                        output.append(f'Line {line_number}: {line.strip()} (Found Abbreviation: {abbreviation})')
-                        found = True
-                        break
-                
-                # Check for full state names with boundary conditions, case-insensitive
-                if not found:
-                    for state_name in state_names:
-                        if re.search(rf'(^|[\s_]){re.escape(state_name)}($|[\s_])', line, re.IGNORECASE):
-                            output.append(f'Line {line_number}: {line.strip()} (Found State Name: {state_name})')
-                            break
-
-                line_number += 1
+                # Check for abbreviations, then full state names (case-insensitive), with boundary conditions
+                found = describe_hit(states, *line_hits(matcher, line))
+                if found:
+                    output.append(f'Line {line_number}: {line.strip()} ({found})')
     except FileNotFoundError:
         print(f"The file '{filename}' was not found.")
     
@@ -75,16 +445,13 @@ def extract_version_from_filename(filename):
 
 # Get version number from the file and date from the most recent part of the release note
 def extract_version_and_date_from_file(file_path):
-    version_pattern = re.compile(r'version:\s*([^\s]+)', re.IGNORECASE)
-    date_pattern = re.compile(r'\b\d{1,2}/\d{1,2}/(\d{2}|\d{4})\b') 
-    
     try:
         with open(file_path, 'r', encoding="utf8", errors='ignore') as file:
             for line in file:
-                version_match = version_pattern.search(line)
+                version_match = VERSION_PATTERN.search(line)
                 if version_match:
                     version_info = version_match.group(1).strip()
-                    date_match = date_pattern.search(line)
+                    date_match = DATE_PATTERN.search(line)
                     date_info = date_match.group(0) if date_match else None
                     return version_info, date_info
     except FileNotFoundError:
@@ -93,8 +460,7 @@ def extract_version_and_date_from_file(file_path):
     return None, None
 
 # Parse the date to work with multiple date formats
-def parse_date(date_str):
-    date_formats = ['%m/%d/%Y', '%m/%d/%y']
+def parse_date(date_str, date_formats=DATE_FORMATS):
     for date_format in date_formats:
         try:
             return datetime.strptime(date_str, date_format)
@@ -102,71 +468,1296 @@ def parse_date(date_str):
             continue
     return None
 
-# When clicking on a file in the application
+# Number of release note sections to scan for a state
+def section_limit_for(state):
+    return SECTION_LIMITS.get(state, state_rules(state).section_limit)
+
+# Sections to read so every state's limit is covered, 0 when some state reads the whole file
+def scan_section_limit():
+    profile = active_rules()
+    limits = [profile.default.section_limit, *(rules.section_limit for rules in profile.states.values()), *SECTION_LIMITS.values()]
+    return 0 if 0 in limits else max(limits)
+
+# Raised when the rule profile can't be read or has a mistake in it
+class RuleError(Exception):
+    pass
+
+# Rules from the text of a rule profile laid over DEFAULT_RULES, checked so mistakes are reported when it's loaded rather than mid scan
+def parse_rules(text):
+    rules = dict(DEFAULT_RULES)
+    if text.strip():
+        try:
+            overrides = json.loads(text)
+        except ValueError as e:
+            raise RuleError(f"not valid JSON: {e}")
+        if not isinstance(overrides, dict):
+            raise RuleError("expected a JSON object")
+        unknown = sorted(set(overrides) - set(DEFAULT_RULES))
+        if unknown:
+            raise RuleError(f"unknown setting {unknown[0]}")
+        rules.update(overrides)
+
+    states = load_states()
+    state_names = {name for _, name in states}
+    mentions = state_names | {abbreviation for abbreviation, _ in states}
+    check_rules(rules, 'skip', 'version', 'date', 'date_formats', 'sections', 'max_date_range')
+    if not isinstance(rules['states'], dict):
+        raise RuleError("states should be an object of state names")
+    for state, overrides in rules['states'].items():
+        if state not in state_names:
+            raise RuleError(f"unknown state '{state}'")
+        if not isinstance(overrides, dict):
+            raise RuleError(f"{state}: expected an object of settings")
+        unknown = sorted(set(overrides) - set(STATE_RULE_KEYS))
+        if unknown:
+            raise RuleError(f"{state}: unknown setting {unknown[0]}")
+        check_rules(overrides, *overrides, context=f"{state}: ")
+        for mention in overrides.get('allowed', ()):
+            if mention not in mentions:
+                raise RuleError(f"{state}: '{mention}' in allowed is not a state name or abbreviation")
+    return rules
+
+# Check the type of each setting, and that its patterns compile
+def check_rules(rules, *keys, context=''):
+    for key in keys:
+        value = rules[key]
+        if key in ('sections', 'max_date_range'):
+            if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+                raise RuleError(f"{context}{key} should be a whole number")
+            continue
+        patterns = [value] if key in ('version', 'date') else value
+        if not isinstance(patterns, list) or not all(isinstance(pattern, str) for pattern in patterns):
+            raise RuleError(f"{context}{key} should be {'a pattern' if key in ('version', 'date') else 'a list of strings'}")
+        if key in ('allowed', 'date_formats'):
+            continue
+        for pattern in patterns:
+            try:
+                compiled = re.compile(pattern)
+            except re.error as e:
+                raise RuleError(f"{context}{key} pattern {pattern!r}: {e}")
+            if key == 'version' and not compiled.groups:
+                raise RuleError(f"{context}version pattern {pattern!r} needs a group around the version number")
+
+# Python expression for the skip patterns of a profile in the generated scan loop. Plain text becomes an `in` check and
+# ^text a startswith, the rest are joined into one regex searched once per line
+def skip_test_source(patterns, namespace):
+    tests = []
+    regexes = []
+    for pattern in patterns:
+        text = pattern[1:] if pattern.startswith('^') else pattern
+        if text and text == text.strip() and not REGEX_SPECIAL_CHARACTERS.intersection(text):
+            tests.append(f'line.lstrip().startswith({text!r})' if pattern.startswith('^') else f'{text!r} in line')
+        else:
+            regexes.append(pattern)
+    if regexes:
+        namespace['SKIP_PATTERN'] = re.compile('|'.join(f'(?:{pattern})' for pattern in regexes))
+        tests.append('SKIP_PATTERN.search(line.strip())')
+    return ' or '.join(tests) or 'False'
+
+# Compile checked rules into a RuleProfile. The scan loop is generated as Python source and compiled once per fingerprint
+def compile_rule_profile(fingerprint, rules):
+    headers = [(rules['version'], rules['date'])]
+    states = {}
+    for state, overrides in rules['states'].items():
+        header = (overrides.get('version', rules['version']), overrides.get('date', rules['date']))
+        if header not in headers:
+            headers.append(header)
+        skip = overrides.get('skip')
+        states[state] = StateRules(
+            overrides.get('sections', rules['sections']),
+            overrides.get('max_date_range', rules['max_date_range']),
+            headers.index(header),
+            re.compile('|'.join(f'(?:{pattern})' for pattern in skip)) if skip else None,
+            frozenset(overrides.get('allowed', ())),
+            tuple(overrides.get('date_formats', rules['date_formats'])),
+        )
+    default = StateRules(rules['sections'], rules['max_date_range'], 0, None, frozenset(), tuple(rules['date_formats']))
+
+    namespace = {
+        'ScanResult': ScanResult, 'StateHit': StateHit, 'SECTION_BOUNDARY_PATTERN': SECTION_BOUNDARY_PATTERN, 'scan_stats': scan_stats,
+        'time': time, 'line_hits': line_hits, 'timed_line_hits': timed_line_hits, 'section_masks_of': section_masks_of, 'parse_date': parse_date,
+    }
+    compiled_headers = tuple((re.compile(version, re.IGNORECASE), re.compile(date)) for version, date in headers)
+    for index, (version_pattern, date_pattern) in enumerate(compiled_headers):
+        namespace[f'VERSION_{index}'] = version_pattern
+        namespace[f'DATE_{index}'] = date_pattern
+    extra = range(1, len(headers))
+    if extra:
+        section_break = SECTION_BREAK_TEMPLATE.format(test='section_limit and sections >= section_limit and ' + ' and '.join(f'sections_{index} >= section_limit' for index in extra))
+    else:
+        section_break = SECTION_BREAK_TEMPLATE.format(test='sections == section_limit')
+    source = SCAN_LINES_TEMPLATE.format(
+        extra_init=''.join(f'    version_{index} = date_{index} = None\n    sections_{index} = 0\n    section_started_{index} = False\n' for index in extra),
+        main_break='' if extra else section_break,
+        extra_headers=''.join(EXTRA_HEADER_TEMPLATE.format(index=index, extra_break=section_break if index == extra[-1] else '') for index in extra),
+        extra_sections=', (' + ''.join(f'sections_{index}, ' for index in extra) + ')' if extra else '',
+        extra_result=''.join(f'(version_{index}, date_{index}), ' for index in extra),
+        extra_masks=''.join(f'section_masks_of(hits, sections_{index}, {index}), ' for index in extra),
+        skip_test=skip_test_source(rules['skip'], namespace),
+    )
+    exec(compile(source, f'<rule profile {fingerprint[:12]}>', 'exec'), namespace)
+
+    # The memory-mapped scan finds header lines with a byte pattern, then reads them with the str patterns
+    byte_headers = tuple(BYTE_VERSION_PATTERN if version == VERSION_PATTERN.pattern else re.compile(version.encode('utf8'), re.IGNORECASE) for version, _ in headers)
+    return RuleProfile(fingerprint, namespace['scan_lines'], namespace['skip_line'], compiled_headers, byte_headers, default, states)
+
+# Load the rule profile at path, DEFAULT_RULES when there is no file there unless required is set.
+# Compiled profiles are kept by the fingerprint of their rules, so loading an unchanged profile again costs only the parse
+def load_rules(path, required=False):
+    text = ''
+    if path:
+        try:
+            with open(path, 'r', encoding="utf8") as file:
+                text = file.read()
+        except FileNotFoundError:
+            if required:
+                raise RuleError(f"{path} was not found")
+        except OSError as e:
+            raise RuleError(f"could not read {path}: {e}")
+    try:
+        rules = parse_rules(text)
+    except RuleError as e:
+        raise RuleError(f"{path}: {e}")
+    fingerprint = hashlib.blake2b(json.dumps([SCAN_RULES_VERSION, rules], sort_keys=True).encode('utf8'), digest_size=16).hexdigest()
+    profile = compiled_rule_profiles.get(fingerprint)
+    if profile is None:
+        profile = compiled_rule_profiles[fingerprint] = compile_rule_profile(fingerprint, rules)
+    return profile
+
+# The rule profile in use, loaded from rules_path the first time it's needed
+def active_rules():
+    global rule_profile
+    if rule_profile is None:
+        rule_profile = load_rules(rules_path)
+    return rule_profile
+
+# Rules for a state, the profile's defaults unless the profile has an entry for it
+def state_rules(state):
+    profile = active_rules()
+    return profile.states.get(state, profile.default)
+
+# Bitmask of the states that don't count against a file for a state: the state itself and the mentions its rules allow
+def ignored_states_mask(state):
+    allowed = state_rules(state).allowed
+    mask = 0
+    for index, (abbreviation, name) in enumerate(state_data):
+        if name == state or abbreviation in allowed or name in allowed:
+            mask |= 1 << index
+    return mask
+
+# Version, date and parsed date of a file for a state, from the header patterns and date formats in the state's rules.
+# The scan parses the main header's date with DATE_FORMATS, other dates are parsed here
+def state_header(result, state):
+    rules = state_rules(state)
+    if rules.header == 0 or not result.extra_headers:
+        version, date, date_obj = result.version, result.date, result.date_obj
+    else:
+        version, date = result.extra_headers[rules.header - 1]
+        date_obj = None
+    if date and (date_obj is None or rules.date_formats != DATE_FORMATS):
+        date_obj = parse_date(date, rules.date_formats)
+    return version, date, date_obj
+
+# Which version header of the rule profile a state's sections are counted from. Results without extra section counts,
+# from an older index or a PDF, only have the main header's
+def state_header_index(result, state):
+    header = state_rules(state).header
+    return header if header and len(result.extra_section_masks) >= header else 0
+
+# Bitmask of the states mentioned in each section, with sections counted from the given version header of the rule profile
+def section_masks_of(hits, sections, header=0):
+    section_masks = [0] * (sections + 1)
+    for hit in hits:
+        section = hit.section if header == 0 else hit.extra_sections[header - 1]
+        for index in hit.abbreviations + hit.names:
+            section_masks[section] |= 1 << index
+    return tuple(section_masks)
+
+# Read the file once and collect everything the checks need: every state mentioned, version, date and line count
+# Reading stops at the end of the latest section(s), older history in cumulative release notes isn't checked
+def scan_file(file_path, matcher, section_limit=DEFAULT_SECTION_LIMIT):
+    if is_pdf(file_path):
+        lines = pdf_lines(file_path)
+        try:
+            return scan_lines(lines, matcher, section_limit)
+        finally:
+            # Cancels the page batches the scan didn't need
+            lines.close()
+    if os.path.isfile(file_path) and os.path.getsize(file_path) >= MMAP_SCAN_THRESHOLD:
+        return scan_file_mmap(file_path, matcher, section_limit)
+
+    try:
+        with open(file_path, 'rb') as file:
+            line_index = LineIndex([], [])
+            result = scan_lines(itertools.chain.from_iterable(indexed_blocks(file, line_index)), matcher, section_limit)
+            return result._replace(line_index=line_index)
+    except FileNotFoundError as e:
+        # Reported on stderr so batch output stays parseable, check_file reports it as unreadable
+        sys.stderr.write(f"The file '{file_path}' was not found.\n")
+        return ScanResult([], (0,), None, None, 0, None, error=e)
+
+# The checks of scan_file over any iterable of text lines, such as an open file or an archive member.
+# The loop itself is generated from the rule profile, see SCAN_LINES_TEMPLATE
+def scan_lines(lines, matcher, section_limit=DEFAULT_SECTION_LIMIT):
+    return active_rules().scan_lines(lines, matcher, section_limit)
+
+# The scan loop a rule profile is compiled into. The header patterns and skip checks are filled in, so every line goes through
+# one function instead of a chain of rule checks. The extra headers are only there for states with their own version/date patterns.
+# Sections are counted from each header apart, and reading stops once every header has reached the section limit
+SCAN_LINES_TEMPLATE = '''
+def scan_lines(lines, matcher, section_limit):
+    hits = []
+    version_info = date_info = None
+{extra_init}    line_count = version_line = 0
+    sections = 0
+    section_started = False
+    # Stage times and counters when the scan is instrumented, see instrumented_scan
+    stats = getattr(scan_stats, 'current', None)
+    for line_count, line in enumerate(lines, 1):
+        # Version and date come from the first line with a version header. A rule pattern can match without its version group
+        # taking part, such a line isn't a header
+        if version_info is None:
+            if stats:
+                started = time.perf_counter()
+            version_match = VERSION_0.search(line)
+            if version_match and version_match.group(1) is not None:
+                version_info = version_match.group(1).strip()
+                version_line = line_count
+                date_match = DATE_0.search(line)
+                date_info = date_match.group(0) if date_match else None
+            if stats:
+                stats[0]['version_date'] += time.perf_counter() - started
+                stats[1]['regex_evaluations'] += 2 if version_match else 1
+
+        # Boundaries only count once the version header is found and some text has followed it,
+        # so neither a title underline nor one under the version header ends the scan
+        elif SECTION_BOUNDARY_PATTERN.match(line):
+            if section_started:
+                sections += 1
+{main_break}        elif not section_started and line.strip():
+            section_started = True
+{extra_headers}
+        if {skip_test}:
+            if stats:
+                stats[1]['lines_skipped'] += 1
+            continue
+
+        abbreviations, names = line_hits(matcher, line) if stats is None else timed_line_hits(matcher, line, *stats)
+        if abbreviations or names:
+            hits.append(StateHit(line_count, line.strip(), sections, abbreviations, names{extra_sections}))
+
+    if stats:
+        stats[1]['lines_scanned'] += line_count
+        # One section boundary check for every line after the version header
+        stats[1]['regex_evaluations'] += line_count - version_line if version_info else 0
+
+    date_obj = parse_date(date_info) if date_info else None
+    return ScanResult(hits, section_masks_of(hits, sections), version_info, date_info, line_count, date_obj, extra_headers=({extra_result}),
+                      extra_section_masks=({extra_masks}))
+
+def skip_line(line):
+    return {skip_test}
+'''
+
+# Extra version/date header in the generated scan loop, found on the first line it matches like the main one, with its own section count.
+# The last header checks whether every header has read enough sections, by then the others have counted the line too
+EXTRA_HEADER_TEMPLATE = '''
+        if version_{index} is None:
+            version_match = VERSION_{index}.search(line)
+            if version_match and version_match.group(1) is not None:
+                version_{index} = version_match.group(1).strip()
+                date_match = DATE_{index}.search(line)
+                date_{index} = date_match.group(0) if date_match else None
+        elif SECTION_BOUNDARY_PATTERN.match(line):
+            if section_started_{index}:
+                sections_{index} += 1
+{extra_break}        elif not section_started_{index} and line.strip():
+            section_started_{index} = True
+'''
+
+# Stop reading once the section limit is reached, indented for the section boundary branch of the last header in the scan loop
+SECTION_BREAK_TEMPLATE = '''                if {test}:
+                    break
+'''
+
+# Decoded lines of a binary file a block at a time, recording where each block starts in line_index.
+# Lines are split on \n only like the memory-mapped scan, the decoding is done per block instead of per line
+def indexed_blocks(file, line_index, block_size=LINE_INDEX_BLOCK_SIZE):
+    line_number = 1
+    offset = 0
+    rest = b''
+    while True:
+        block = file.read(block_size)
+        if not block:
+            break
+        if rest:
+            block = rest + block
+        # Blocks end on a newline so no line or character is split between two of them
+        end = block.rfind(b'\n') + 1
+        if not end:
+            rest = block
+            continue
+        rest = block[end:]
+        line_index.line_numbers.append(line_number)
+        line_index.offsets.append(offset)
+        line_number += block.count(b'\n', 0, end)
+        offset += end
+        yield block[:end - 1].decode("utf8", errors='ignore').split('\n')
+    if rest:
+        line_index.line_numbers.append(line_number)
+        line_index.offsets.append(offset)
+        yield [rest.decode("utf8", errors='ignore')]
+
+# Count newlines in part of a memory map a chunk at a time, so the whole file is never copied
+def count_newlines(buffer, start, end, chunk_size=1024 * 1024):
+    return sum(buffer[position:min(position + chunk_size, end)].count(b'\n') for position in range(start, end, chunk_size))
+
+# First line of a memory map with a version header, as the end of the line, the version and the date. The byte pattern finds
+# candidate lines, the str patterns read them the same way the line by line scan would
+def find_header(buffer, byte_version, version_pattern, date_pattern):
+    position = 0
+    while True:
+        match = byte_version.search(buffer, position)
+        if not match:
+            return None
+        line_start = buffer.rfind(b'\n', 0, match.start()) + 1
+        line_end = buffer.find(b'\n', match.start())
+        line_end = len(buffer) if line_end == -1 else line_end
+        line = buffer[line_start:line_end].decode('utf8', errors='ignore')
+        version_match = version_pattern.search(line)
+        if version_match and version_match.group(1) is not None:
+            date_match = date_pattern.search(line)
+            return line_end, version_match.group(1).strip(), date_match.group(0) if date_match else None
+        # The byte pattern matched across lines, which the line by line scan never sees, or matched without the version group
+        position = line_end + 1
+
+# Whether a part of a memory map has a line that isn't blank, checked on the decoded line the same way as the line by line scan
+def has_section_text(buffer, start, end):
+    while True:
+        match = BYTE_TEXT_PATTERN.search(buffer, start, end)
+        if not match:
+            return False
+        line_start = buffer.rfind(b'\n', 0, match.start()) + 1
+        line_end = buffer.find(b'\n', match.start(), end)
+        line_end = end if line_end == -1 else line_end
+        if buffer[line_start:line_end].decode('utf8', errors='ignore').strip():
+            return True
+        start = line_end + 1
+
+# Starts of the lines of a memory map up to end that may have a full state name on them. The names pattern is case-sensitive, so
+# it runs over lowercased copies of the map a chunk of whole lines at a time. Each chunk gets the newline before it, the byte
+# the pattern expects in front of a name at the start of a line
+def name_candidate_lines(byte_names, buffer, end):
+    start = 0
+    while start < end:
+        stop = buffer.rfind(b'\n', start, min(start + BYTE_NAME_CHUNK_SIZE, end)) + 1
+        if stop <= start:
+            # A line longer than a chunk
+            stop = buffer.find(b'\n', start + BYTE_NAME_CHUNK_SIZE, end) + 1 or end
+        chunk = b'\n' + buffer[start:stop].lower()
+        for match in byte_names.finditer(chunk):
+            # Names never span lines, so the line of the match's end is the line of the name. The chunk starts one byte before start
+            yield start + chunk.rfind(b'\n', 0, match.end())
+        start = stop
+
+# Section boundary lines of a memory map from start, a line start, to end as matches of BYTE_SECTION_BOUNDARY_PATTERN.
+# Only the lines with a run of dashes or equals signs on them are checked
+def section_boundary_matches(buffer, start, end):
+    position = start
+    while True:
+        rule = BYTE_SECTION_RULE_PATTERN.search(buffer, position, end)
+        if not rule:
+            return
+        boundary = BYTE_SECTION_BOUNDARY_PATTERN.match(buffer, buffer.rfind(b'\n', 0, rule.start()) + 1, end)
+        if boundary:
+            yield boundary
+        line_end = buffer.find(b'\n', rule.end(), end)
+        if line_end == -1:
+            return
+        position = line_end + 1
+
+# Section boundaries of a memory map after a version header line, up to the section limit if there is one.
+# Like the line by line scan, boundaries before the first line of text under the header don't count
+def section_boundaries(buffer, line_end, section_limit=0, end=None):
+    boundaries = []
+    section_started = False
+    text_from = line_end + 1
+    for boundary in section_boundary_matches(buffer, line_end + 1, len(buffer) if end is None else end):
+        if not section_started:
+            section_started = has_section_text(buffer, text_from, boundary.start())
+            text_from = boundary.end()
+            if not section_started:
+                continue
+        boundaries.append(boundary.start())
+        if len(boundaries) == section_limit:
+            break
+    return boundaries
+
+# Same checks as scan_file, run with byte patterns over a memory map of the whole file.
+# Nothing is decoded except the lines that are reported, and line numbers are only counted up to each hit
+def scan_file_mmap(file_path, matcher, section_limit=DEFAULT_SECTION_LIMIT):
+    with open(file_path, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        if size == 0:
+            return ScanResult([], (0,), None, None, 0, None)
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            def line_end_of(position):
+                newline = buffer.find(b'\n', position)
+                return size if newline == -1 else newline
+
+            version_info = date_info = None
+            end = size
+            profile = active_rules()
+            stats = getattr(scan_stats, 'current', None)
+            started = time.perf_counter()
+
+            # Version and date come from the first line with a version header, for each header pattern of the rule profile
+            headers = [find_header(buffer, byte_version, *header) for byte_version, header in zip(profile.byte_headers, profile.headers)]
+            if headers[0]:
+                version_info, date_info = headers[0][1:]
+
+            # Sections are counted from each version header apart. Like the line by line scan, the scan is cut off once
+            # every header has reached the section limit, at the last boundary needed
+            header_boundaries = [section_boundaries(buffer, header[0], section_limit) if header else [] for header in headers]
+            if section_limit and all(len(boundaries) == section_limit for boundaries in header_boundaries):
+                end = line_end_of(max(boundaries[-1] for boundaries in header_boundaries)) + 1
+            if section_limit and len(headers) > 1:
+                # Headers keep counting sections past the limit until every header reached it, up to the cut-off
+                header_boundaries = [section_boundaries(buffer, header[0], end=end) if header else [] for header in headers]
+            extra_headers = tuple(header[1:] if header else (None, None) for header in headers[1:])
+            version_done = time.perf_counter()
+
+            # Lines that may mention a state, as abbreviations or as full names. They are checked again with the str patterns below
+            candidate_lines = set()
+            if matcher.byte_abbreviations:
+                for match in matcher.byte_abbreviations.finditer(buffer, 0, end):
+                    candidate_lines.add(buffer.rfind(b'\n', 0, match.start()) + 1)
+            abbreviations_done = time.perf_counter()
+            if matcher.byte_names:
+                candidate_lines.update(name_candidate_lines(matcher.byte_names, buffer, end))
+            if stats:
+                # The whole buffer is searched at once, so each pattern is one evaluation
+                stats[0]['version_date'] += version_done - started
+                stats[0]['abbreviations'] += abbreviations_done - version_done
+                stats[0]['names'] += time.perf_counter() - abbreviations_done
+                stats[1]['regex_evaluations'] += 4
+
+            hits = []
+            line_number = 1
+            counted_to = 0
+            # Line numbers are only counted up to lines that may have a state on them, so those are the lines indexed
+            line_index = LineIndex([1], [0])
+            for line_start in sorted(candidate_lines):
+                line = buffer[line_start:line_end_of(line_start)].decode("utf8", errors="ignore")
+                line_number += count_newlines(buffer, counted_to, line_start)
+                counted_to = line_start
+                line_index.line_numbers.append(line_number)
+                line_index.offsets.append(line_start)
+
+                abbreviations, names = line_hits(matcher, line)
+                if not abbreviations and not names:
+                    continue
+                # Same skip rules as the line by line scan
+                if profile.skip_line(line):
+                    # Only lines with a state on them are looked at here, so this count covers those lines only
+                    if stats:
+                        stats[1]['lines_skipped'] += 1
+                    continue
+                sections = [bisect.bisect_right(boundaries, line_start) for boundaries in header_boundaries]
+                hits.append(StateHit(line_number, line.strip(), sections[0], abbreviations, names, tuple(sections[1:])))
+
+            line_count = count_newlines(buffer, 0, end) + (0 if buffer[end - 1:end] == b'\n' else 1)
+            if stats:
+                stats[1]['lines_scanned'] += line_count
+
+    date_obj = parse_date(date_info) if date_info else None
+    section_masks = [section_masks_of(hits, len(boundaries), header) for header, boundaries in enumerate(header_boundaries)]
+    return ScanResult(hits, section_masks[0], version_info, date_info, line_count, date_obj, line_index=line_index, extra_headers=extra_headers,
+                      extra_section_masks=tuple(section_masks[1:]))
+
+# Whether a path is a zip or tar bundle of release notes
+def is_archive(path):
+    return path.lower().endswith(ARCHIVE_EXTENSIONS) and os.path.isfile(path)
+
+# Path of a file inside an archive, e.g. bundle.zip!/docs/notes_1.2.3.4.txt
+def archive_member_path(archive_path, member):
+    return archive_path + ARCHIVE_SEPARATOR + member
+
+# Split an archive member path into the archive and the member name, paths outside archives have no member
+def split_archive_path(path):
+    position = path.find(ARCHIVE_SEPARATOR)
+    while position != -1:
+        if path[:position].lower().endswith(ARCHIVE_EXTENSIONS):
+            return path[:position], path[position + len(ARCHIVE_SEPARATOR):]
+        position = path.find(ARCHIVE_SEPARATOR, position + 1)
+    return path, None
+
+# Full path of a listed file. Only the archive part of a member path is made absolute, member names always use /
+def absolute_path(path):
+    archive_path, member = split_archive_path(path)
+    return os.path.abspath(path) if member is None else archive_member_path(os.path.abspath(archive_path), member)
+
+# Name shown for a listed file, members keep the archive name in front
+def display_name(path):
+    archive_path, member = split_archive_path(path)
+    return os.path.basename(path) if member is None else archive_member_path(os.path.basename(archive_path), member)
+
+# Release notes in an archive with their content, one at a time in archive order
+def iter_archive_members(archive_path, pattern=ARCHIVE_MEMBER_PATTERN):
+    import posixpath
+    import tarfile
+    import zipfile
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and fnmatch.fnmatch(posixpath.basename(info.filename), pattern):
+                    yield info.filename, archive.read(info)
+    else:
+        # Stream mode reads a compressed tar front to back once instead of seeking back for every member
+        with tarfile.open(archive_path, 'r|*') as archive:
+            for info in archive:
+                if info.isfile() and fnmatch.fnmatch(posixpath.basename(info.name), pattern):
+                    yield info.name, archive.extractfile(info).read()
+
+# Content of one member of an archive, raises KeyError when it isn't there
+def read_archive_member(archive_path, member):
+    import tarfile
+    import zipfile
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as archive:
+            return archive.read(member)
+    with tarfile.open(archive_path) as archive:
+        file = archive.extractfile(member)
+        if file is None:
+            raise KeyError(f"'{member}' is not a file")
+        return file.read()
+
+# Exceptions for an archive that can't be read, only evaluated once something went wrong so the archive modules stay unloaded until then
+def archive_errors():
+    import tarfile
+    import zipfile
+    return zipfile.BadZipFile, tarfile.TarError
+
+# Size of a listed file, archive members are looked up in the archive index
+def source_size(path):
+    archive_path, member = split_archive_path(path)
+    if member is None:
+        return os.path.getsize(path)
+    import tarfile
+    import zipfile
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as archive:
+            return archive.getinfo(member).file_size
+    with tarfile.open(archive_path) as archive:
+        return archive.getmember(member).size
+
+# Open a listed file for reading bytes, archive members are read into memory
+def open_source(path):
+    archive_path, member = split_archive_path(path)
+    if member is None:
+        return open(path, 'rb')
+    return io.BytesIO(read_archive_member(archive_path, member))
+
+# Raised when a PDF can't be read, or there is no PDF library to read it with
+class PdfError(Exception):
+    pass
+
+# Whether a path is a PDF, like a Fortify report
+def is_pdf(path):
+    return path.lower().endswith(PDF_EXTENSIONS)
+
+# PDF library to use, PyMuPDF is preferred since it extracts text much faster. Imported on first use so plain text users never load it
+@lru_cache(maxsize=None)
+def pdf_backend():
+    try:
+        import fitz
+        return 'fitz', fitz
+    except ImportError:
+        pass
+    try:
+        import pypdf
+        return 'pypdf', pypdf
+    except ImportError:
+        return None, None
+
+# Open PDF documents, kept so the batches of one report reuse the parsed document. The time and size make a changed file open again
+@lru_cache(maxsize=4)
+def open_pdf(file_path, mtime_ns, size):
+    backend, module = pdf_backend()
+    if module is None:
+        raise PdfError("Reading PDFs needs PyMuPDF (pip install pymupdf) or pypdf (pip install pypdf).")
+    try:
+        return module.open(file_path) if backend == 'fitz' else module.PdfReader(file_path)
+    except Exception as e:
+        raise PdfError(f"{type(e).__name__}: {e}")
+
+# Number of pages in a PDF
+def pdf_page_count(file_path):
+    stat = os.stat(file_path)
+    with pdf_lock:
+        document = open_pdf(file_path, stat.st_mtime_ns, stat.st_size)
+        return document.page_count if pdf_backend()[0] == 'fitz' else len(document.pages)
+
+# Text of a range of pages. Runs in the pool processes as well, so errors are passed back as PdfError with a plain message
+def extract_pdf_pages(file_path, start, stop):
+    try:
+        stat = os.stat(file_path)
+        # Documents aren't safe to share between threads
+        with pdf_lock:
+            document = open_pdf(file_path, stat.st_mtime_ns, stat.st_size)
+            if pdf_backend()[0] == 'fitz':
+                return [document[index].get_text() for index in range(start, stop)]
+            return [document.pages[index].extract_text() or '' for index in range(start, stop)]
+    except (PdfError, OSError):
+        raise
+    except Exception as e:
+        raise PdfError(f"{type(e).__name__}: {e}")
+
+# Process pool for PDF pages, created on first use. Spawned rather than forked since the GUI process runs threads
+def get_pdf_executor():
+    global pdf_executor
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    with pdf_lock:
+        if pdf_executor is None:
+            pdf_executor = ProcessPoolExecutor(max_workers=PDF_PAGE_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return pdf_executor
+
+# Cached text of a batch of pages, or None
+def cached_pdf_pages(key):
+    with pdf_text_cache_lock:
+        pages = pdf_text_cache.get(key)
+        if pages is not None:
+            pdf_text_cache.move_to_end(key)
+        return pages
+
+# Keep the text of a batch of pages, dropping the least recently used batches past PDF_TEXT_CACHE_MAX_BYTES
+def store_pdf_pages(key, pages):
+    global pdf_text_cache_bytes
+    with pdf_text_cache_lock:
+        if key in pdf_text_cache:
+            return
+        pdf_text_cache[key] = pages
+        pdf_text_cache_bytes += sum(len(page) for page in pages)
+        while pdf_text_cache_bytes > PDF_TEXT_CACHE_MAX_BYTES:
+            _, evicted = pdf_text_cache.popitem(last=False)
+            pdf_text_cache_bytes -= sum(len(page) for page in evicted)
+
+# Text of a PDF page by page, in order. The first batch is extracted right here since most reports have their header and
+# first section boundary on the first pages. Past that the next few batches are extracted on the pool while the current one is scanned,
+# and when the scan stops early the batches it never got to are cancelled
+def iter_pdf_pages(file_path):
+    digest = content_hash(file_path)
+    page_count = pdf_page_count(file_path)
+    batches = [(start, min(start + PDF_PAGES_PER_TASK, page_count)) for start in range(0, page_count, PDF_PAGES_PER_TASK)]
+    pending = {}
+    stats = getattr(scan_stats, 'current', None)
+    try:
+        for index, (start, stop) in enumerate(batches):
+            pages = cached_pdf_pages((digest, start))
+            if pages is None:
+                started = time.perf_counter()
+                if index == 0 or PDF_PAGE_WORKERS == 0:
+                    pages = extract_pdf_pages(file_path, start, stop)
+                else:
+                    for ahead in range(index, min(index + PDF_PAGE_WORKERS, len(batches))):
+                        if ahead not in pending and cached_pdf_pages((digest, batches[ahead][0])) is None:
+                            pending[ahead] = get_pdf_executor().submit(extract_pdf_pages, file_path, *batches[ahead])
+                    pages = pending.pop(index).result()
+                if stats:
+                    stats[0]['pdf_extract'] += time.perf_counter() - started
+                store_pdf_pages((digest, start), pages)
+            yield from pages
+    finally:
+        for future in pending.values():
+            future.cancel()
+
+# Lines of a PDF's text for scan_lines
+def pdf_lines(file_path):
+    for page in iter_pdf_pages(file_path):
+        yield from page.splitlines(keepends=True)
+
+# Same checks as scan_file on content that is already in memory, like an archive member
+def scan_bytes(data, matcher, section_limit=DEFAULT_SECTION_LIMIT):
+    # Decoded the same way as a file on disk, so both give the same line numbers
+    line_index = LineIndex([], [])
+    result = scan_lines(itertools.chain.from_iterable(indexed_blocks(io.BytesIO(data), line_index)), matcher, section_limit)
+    return result._replace(line_index=line_index)
+
+# Scan a listed file, whether it's on disk or inside an archive
+def scan_path(path, matcher, section_limit=DEFAULT_SECTION_LIMIT):
+    archive_path, member = split_archive_path(path)
+    if member is None:
+        return scan_file(path, matcher, section_limit)
+    return scan_bytes(read_archive_member(archive_path, member), matcher, section_limit)
+
+# Line index of a listed file whose scan result didn't come with one, like a result from the index. Keyed by the file's time and size
+@lru_cache(maxsize=8)
+def file_line_index(file_path, mtime_ns, size):
+    line_index = LineIndex([], [])
+    with open_source(file_path) as file:
+        for _ in indexed_blocks(file, line_index):
+            pass
+    return line_index
+
+# Lines around a line of a listed file, as the number of the first one and their text.
+# The read starts from the closest indexed line instead of the start of the file
+def line_context(file_path, line_index, line_number, context=FINDING_CONTEXT_LINES):
+    first = max(1, line_number - context)
+    last = line_number + context
+    if is_pdf(file_path):
+        # Text pulled out of a PDF has no byte offsets, the extracted pages are cached though
+        lines = pdf_lines(file_path)
+        try:
+            return first, [line.rstrip('\r\n') for line in itertools.islice(lines, first - 1, last)]
+        finally:
+            lines.close()
+
+    if line_index is None:
+        stat = os.stat(split_archive_path(file_path)[0])
+        line_index = file_line_index(absolute_path(file_path), stat.st_mtime_ns, stat.st_size)
+    if not line_index.line_numbers:
+        return first, []
+    anchor = max(0, bisect.bisect_right(line_index.line_numbers, line_number) - 1)
+    anchor_line, offset = line_index.line_numbers[anchor], line_index.offsets[anchor]
+
+    with open_source(file_path) as file:
+        before = []
+        if anchor_line > first:
+            # The memory-mapped scan only indexes lines with hits, the lines before one are read backwards from it
+            start = max(0, offset - CONTEXT_READ_BEHIND)
+            file.seek(start)
+            before = file.read(offset - start).split(b'\n')[:-1]
+            # The first piece is only part of a line unless the read began at the start of the file
+            if start:
+                before = before[1:]
+            before = before[-(anchor_line - first):]
+            first = anchor_line - len(before)
+        file.seek(offset)
+        after = list(itertools.islice(file, max(0, first - anchor_line), last - anchor_line + 1))
+    return first, [line.decode("utf8", errors='ignore').rstrip('\r\n') for line in before + after]
+
+# Bitmask of the states other than the given one mentioned in the sections checked for it, less the mentions its rules allow
+def other_states_mask(result, state):
+    if state_rules(state).skip:
+        # Lines the state skips are only known from their text, so its hits are gone through one by one
+        mask = 0
+        for hit in finding_hits(result, state):
+            for index in hit.abbreviations + hit.names:
+                mask |= 1 << index
+        return mask & ~ignored_states_mask(state)
+
+    limit = section_limit_for(state)
+    header = state_header_index(result, state)
+    section_masks = result.section_masks if header == 0 else result.extra_section_masks[header - 1]
+    mask = 0
+    for section_mask in (section_masks[:limit] if limit else section_masks):
+        mask |= section_mask
+    return mask & ~ignored_states_mask(state)
+
+# Hits in the sections checked for a state that mention a state it doesn't ignore, leaving out lines its rules skip
+def finding_hits(result, state):
+    limit = section_limit_for(state)
+    skip = state_rules(state).skip
+    ignored = ignored_states_mask(state)
+    header = state_header_index(result, state)
+    hits = []
+    for hit in result.hits:
+        if limit and (hit.section if header == 0 else hit.extra_sections[header - 1]) >= limit:
+            break
+        if skip and skip.search(hit.text):
+            continue
+        if any(not ignored >> index & 1 for index in hit.abbreviations + hit.names):
+            hits.append(hit)
+    return hits
+
+# A hit formatted the same way as find_states, leaving out the states in the ignored bitmask
+def format_finding(hit, ignored):
+    return f'Line {hit.line_number}: {hit.text} ({describe_hit(state_data, hit.abbreviations, hit.names, ignored)})'
+
+# Lines mentioning states other than the given one, formatted the same way as find_states
+def state_findings(result, state):
+    ignored = ignored_states_mask(state)
+    return [format_finding(hit, ignored) for hit in finding_hits(result, state)]
+
+# Decide the colour of a file for a state from its scan result, along with the reasons it is red besides state mentions
+def check_file(file_name, result, state):
+    messages = []
+    if result.error:
+        messages.append(f"Could not read file: {result.error}")
+    version, date, date_obj = state_header(result, state)
+    title_version = extract_version_from_filename(file_name)
+    if title_version and version and title_version != version:
+        messages.append(f"Version mismatch: Filename version ({title_version}) does not match file version ({version}).")
+    if not title_version or not version:
+        messages.append("Version number is missing in the filename or the file content.")
+
+    max_date_range = state_rules(state).max_date_range
+    if not date:
+        messages.append("No date found in the file.")
+    elif date_obj is None:
+        messages.append(f"Invalid date format found in file: {date}")
+    elif abs((datetime.now() - date_obj).days) > max_date_range:
+        messages.append(f"Date on file is not within {max_date_range} days of current date: {date}")
+
+    color = 'red' if messages or other_states_mask(result, state) else 'green'
+    return color, messages
+
+# Matcher for every state, the selected state is only applied when checking the result
+def all_states_matcher():
+    return build_state_matcher(tuple(state_data))
+
+# Rough memory held by a cached scan result, used to keep the cache under SCAN_CACHE_MAX_BYTES
+def scan_result_size(result):
+    size = sys.getsizeof(result) + sum(sys.getsizeof(hit) + sys.getsizeof(hit.text) for hit in result.hits)
+    if result.line_index:
+        size += sum(map(sys.getsizeof, result.line_index))
+    return size
+
+# Scan a file unless an unchanged copy of it was already scanned. Results hold every state, so they are good for any selection.
+# Archive members are keyed by the archive's time and size, data is the member content and content_digest its hash when the caller has them
+def cached_scan_file(file_path, data=None, content_digest=None):
+    try:
+        path_key, key = scan_cache_key(file_path)
+    except OSError:
+        # Nothing to key on, let scan_file report the missing file
+        return scan_path(file_path, all_states_matcher(), scan_section_limit())
+
+    with scan_cache_lock:
+        entry = scan_cache.get(key)
+        if entry:
+            scan_cache.move_to_end(key)
+            scan_cache_stats['hits'] += 1
+            return entry[0]
+        scan_cache_stats['misses'] += 1
+
+    # Scan outside the lock so worker threads don't wait on each other
+    result = indexed_scan(file_path, data, scan_section_limit(), content_digest)
+    size = scan_result_size(result)
+    with scan_cache_lock:
+        store_scan_result(path_key, key, result, size)
+    return result
+
+# Full path of a listed file and its key in the scan cache, with the time and size of the file on disk or of the archive for a member
+def scan_cache_key(file_path):
+    stat = os.stat(split_archive_path(file_path)[0])
+    path_key = absolute_path(file_path)
+    return path_key, (path_key, stat.st_mtime_ns, stat.st_size)
+
+# Cache a result scanned from a copy of a file, so opening its findings doesn't scan it again
+def cache_scan_result(file_path, result):
+    try:
+        path_key, key = scan_cache_key(file_path)
+    except OSError:
+        return
+    size = scan_result_size(result)
+    with scan_cache_lock:
+        store_scan_result(path_key, key, result, size)
+
+# Content hash of a listed file, and its content when that had to be read for the hash and can be scanned from memory.
+# Unchanged files get their hash from content_digests without being read. Text files are read whole and hashed, so the scan
+# doesn't read them a second time. PDFs and files big enough for the memory-mapped scan are hashed a chunk at a time
+def listed_content_digest(file_path):
+    try:
+        key = scan_cache_key(file_path)[1]
+    except OSError:
+        # Nothing to key on, the scan reports the missing file
+        return None, None
+    with scan_cache_lock:
+        content_digest = content_digests.get(key)
+        if content_digest:
+            content_digests.move_to_end(key)
+            return content_digest, None
+
+    data = None
+    if is_pdf(file_path) or (split_archive_path(file_path)[1] is None and key[2] >= MMAP_SCAN_THRESHOLD):
+        content_digest = content_hash(file_path)
+    else:
+        with open_source(file_path) as file:
+            data = file.read()
+        content_digest = hashlib.blake2b(data, digest_size=20).hexdigest()
+    with scan_cache_lock:
+        content_digests[key] = content_digest
+        if len(content_digests) > SCAN_CACHE_MAX_ENTRIES:
+            content_digests.popitem(last=False)
+    return content_digest, data
+
+# Add a result to the cache, replacing the one for an older version of the file
+def store_scan_result(path_key, key, result, size):
+    global scan_cache_bytes
+    # Another thread may have scanned the same file meanwhile
+    if key in scan_cache:
+        return
+
+    # The file changed on disk, drop the result for the old version
+    old_key = scan_cache_keys.pop(path_key, None)
+    if old_key in scan_cache:
+        scan_cache_bytes -= scan_cache.pop(old_key)[1]
+
+    scan_cache[key] = (result, size)
+    scan_cache_keys[path_key] = key
+    scan_cache_bytes += size
+
+    # Evict least recently used results until both limits are met
+    while len(scan_cache) > SCAN_CACHE_MAX_ENTRIES or scan_cache_bytes > SCAN_CACHE_MAX_BYTES:
+        evicted_key, (_, evicted_size) = scan_cache.popitem(last=False)
+        scan_cache_bytes -= evicted_size
+        if scan_cache_keys.get(evicted_key[0]) == evicted_key:
+            del scan_cache_keys[evicted_key[0]]
+
+# Fingerprint of everything that decides a scan result besides the file content
+@lru_cache(maxsize=8)
+def rules_fingerprint(states, section_limit, profile):
+    rules = [SCAN_RULES_VERSION, states, section_limit, profile, SECTION_BOUNDARY_PATTERN.pattern]
+    return hashlib.blake2b(json.dumps(rules).encode('utf8'), digest_size=16).hexdigest()
+
+# Scan result as JSON for the index, the parsed date is left out since it's derived from the date text
+def encode_scan_result(result):
+    return json.dumps([[list(hit) for hit in result.hits], result.section_masks, result.version, result.date, result.line_count, result.extra_headers,
+                       result.extra_section_masks])
+
+# Scan result back from the index
+def decode_scan_result(text):
+    hits, section_masks, version, date, line_count, extra_headers, extra_section_masks = json.loads(text)
+    hits = [StateHit(line_number, line, section, tuple(abbreviations), tuple(names), tuple(extra_sections))
+            for line_number, line, section, abbreviations, names, extra_sections in hits]
+    return ScanResult(hits, tuple(section_masks), version, date, line_count, parse_date(date) if date else None, extra_headers=tuple(map(tuple, extra_headers)),
+                      extra_section_masks=tuple(map(tuple, extra_section_masks)))
+
+# Connection to the scan index for the current thread, None when the index is off or can't be opened.
+# The default rollback journal is kept since WAL doesn't work for an index on a network share
+def scan_index():
+    global scan_index_path
+    import sqlite3
+    connection = getattr(scan_index_connections, 'connection', None)
+    if connection is None and scan_index_path:
+        try:
+            connection = sqlite3.connect(scan_index_path, timeout=SCAN_INDEX_TIMEOUT, isolation_level=None)
+            connection.execute("CREATE TABLE IF NOT EXISTS scans (content_hash TEXT, rules TEXT, result TEXT, size INTEGER, last_used REAL, PRIMARY KEY (content_hash, rules))")
+            scan_index_connections.connection = connection
+        except sqlite3.Error as e:
+            sys.stderr.write(f"Could not open the scan index '{scan_index_path}', scanning without it: {e}\n")
+            scan_index_path = None
+            return None
+    return connection
+
+# Result for content already scanned with the same rules, or None
+def lookup_scan_index(content_digest, rules):
+    import sqlite3
+    connection = scan_index()
+    if connection is None:
+        return None
+    try:
+        row = connection.execute("SELECT result FROM scans WHERE content_hash = ? AND rules = ?", (content_digest, rules)).fetchone()
+        if row is None:
+            return None
+        # Only touched once an hour so a shared index isn't written on every lookup
+        now = time.time()
+        connection.execute("UPDATE scans SET last_used = ? WHERE content_hash = ? AND rules = ? AND last_used < ?", (now, content_digest, rules, now - 3600))
+        return decode_scan_result(row[0])
+    except (sqlite3.Error, ValueError) as e:
+        sys.stderr.write(f"Scan index lookup failed: {e}\n")
+        return None
+
+# Keep a scan result in the index, evicting the least recently used results now and then
+def store_scan_index(content_digest, rules, result):
+    import sqlite3
+    connection = scan_index()
+    if connection is None:
+        return
+    text = encode_scan_result(result)
+    try:
+        connection.execute("INSERT OR REPLACE INTO scans VALUES (?, ?, ?, ?, ?)", (content_digest, rules, text, len(text), time.time()))
+        if next(scan_index_writes) % SCAN_INDEX_EVICT_EVERY == 0:
+            evict_scan_index(connection)
+    except sqlite3.Error as e:
+        sys.stderr.write(f"Could not store scan result in the index: {e}\n")
+
+# Delete the least recently used results until the index is back under 90% of SCAN_INDEX_MAX_BYTES
+def evict_scan_index(connection):
+    total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM scans").fetchone()[0]
+    if total <= SCAN_INDEX_MAX_BYTES:
+        return
+    kept = 0
+    for last_used, size in connection.execute("SELECT last_used, size FROM scans ORDER BY last_used DESC").fetchall():
+        kept += size
+        if kept > SCAN_INDEX_MAX_BYTES * 0.9:
+            connection.execute("DELETE FROM scans WHERE last_used <= ?", (last_used,))
+            break
+
+# Scan a file unless the index has a result for the same content and rules. Files that can't be hashed are scanned as usual
+# so the scanner reports them. Results for unreadable files are never stored
+def indexed_scan(file_path, data, section_limit, content_digest=None):
+    matcher = all_states_matcher()
+    if not scan_index_path:
+        content_digest = None
+    elif content_digest is None:
+        try:
+            content_digest = hashlib.blake2b(data, digest_size=20).hexdigest() if data is not None else content_hash(file_path)
+        except (OSError, KeyError, *archive_errors()):
+            pass
+    if content_digest:
+        rules = rules_fingerprint(matcher.states, section_limit, active_rules().fingerprint)
+        result = lookup_scan_index(content_digest, rules)
+        if result is not None:
+            with scan_cache_lock:
+                scan_cache_stats['index_hits'] += 1
+            return result
+
+    if data is None:
+        result = instrumented_scan(file_path, scan_path, file_path, matcher, section_limit)
+    else:
+        result = instrumented_scan(file_path, scan_bytes, data, matcher, section_limit)
+    if content_digest and result.error is None:
+        store_scan_index(content_digest, rules, result)
+    return result
+
+# Cache counters, shown at the bottom of the window
+def scan_cache_info():
+    with scan_cache_lock:
+        return dict(scan_cache_stats, entries=len(scan_cache), bytes=scan_cache_bytes)
+
+# Refresh the cache counters label
+def update_cache_status():
+    info = scan_cache_info()
+    cache_label.config(text=f"Scan cache: {info['hits']} hits, {info['misses']} misses ({info['index_hits']} from index), {info['entries']} files")
+
+# Run a scan with its stages timed and counted when instrumentation is on. The scanners pick up the counters from a thread-local,
+# so they don't need an extra argument. Time not spent in a timed stage went to reading and decoding
+def instrumented_scan(file_path, scan, *args):
+    if not instrumentation_enabled:
+        return scan(*args)
+    stages, counters = Counter(), Counter()
+    scan_stats.current = (stages, counters)
+    started = time.perf_counter()
+    try:
+        return scan(*args)
+    finally:
+        elapsed = time.perf_counter() - started
+        scan_stats.current = None
+        stages['read'] += max(0.0, elapsed - sum(stages.values()))
+        record_stats(file_path, 'scan', started, elapsed, stages, counters)
+
+# Time a UI stage for a file when instrumentation is on
+@contextlib.contextmanager
+def timed_stage(file_path, stage):
+    if not instrumentation_enabled:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        record_stats(file_path, stage, started, elapsed, {stage: elapsed})
+
+# Add the stage times of a file to the totals, to the file's own breakdown and to the trace
+def record_stats(file_path, name, started, elapsed, stages, counters=()):
+    with stats_lock:
+        stage_totals.update(stages)
+        scan_counters.update(counters)
+        file_timings.setdefault(file_path, Counter()).update(stages)
+        if len(trace_events) < TRACE_MAX_EVENTS:
+            args = {'file': file_path, **{f"{stage}_ms": round(seconds * 1000, 3) for stage, seconds in stages.items()}, **dict(counters)}
+            trace_events.append({'name': name, 'ph': 'X', 'ts': round((started - trace_origin) * 1e6), 'dur': round(elapsed * 1e6),
+                                 'pid': os.getpid(), 'tid': threading.get_ident(), 'args': args})
+
+# cProfile only sees the thread it was enabled on, so each scanning thread gets its own profiler. They are merged by save_profile
+def profiled(func, *args):
+    if profile_dir is None:
+        return func(*args)
+    import cProfile
+    profiler = getattr(scan_stats, 'profiler', None)
+    if profiler is None:
+        profiler = scan_stats.profiler = cProfile.Profile()
+        with stats_lock:
+            profilers.append(profiler)
+    profiler.enable()
+    try:
+        return func(*args)
+    finally:
+        profiler.disable()
+
+# Profile the calling thread until save_profile
+def start_profiling():
+    import cProfile
+    profiler = scan_stats.profiler = cProfile.Profile()
+    with stats_lock:
+        profilers.append(profiler)
+    profiler.enable()
+
+# Stage totals, counters and the slowest files
+def stats_summary():
+    with stats_lock:
+        slowest = sorted(file_timings.items(), key=lambda item: sum(item[1].values()), reverse=True)[:SLOWEST_FILES_SHOWN]
+        return {
+            'stages_ms': {stage: round(stage_totals[stage] * 1000, 3) for stage in STAGES},
+            'counters': dict(scan_counters),
+            'slowest_files': [{'file': file_path, 'ms': round(sum(stages.values()) * 1000, 3),
+                               'stages_ms': {stage: round(seconds * 1000, 3) for stage, seconds in stages.items()}} for file_path, stages in slowest],
+        }
+
+# Trace in the Chrome trace event format, it opens in chrome://tracing or Perfetto. The summary goes along in otherData
+def write_trace(path):
+    summary = stats_summary()
+    with stats_lock:
+        events = list(trace_events)
+    with open(path, 'w') as file:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': summary}, file)
+
+# Write the merged cProfile stats, the top functions as text and the JSON trace into the profile folder
+def save_profile(folder):
+    import pstats
+    os.makedirs(folder, exist_ok=True)
+    profiler = getattr(scan_stats, 'profiler', None)
+    if profiler:
+        profiler.disable()
+    with stats_lock:
+        collected = list(profilers)
+    if collected:
+        stats_path = os.path.join(folder, 'profile.prof')
+        pstats.Stats(*collected).dump_stats(stats_path)
+        with open(os.path.join(folder, 'profile.txt'), 'w') as file:
+            pstats.Stats(stats_path, stream=file).sort_stats('cumulative').print_stats(50)
+    write_trace(os.path.join(folder, 'trace.json'))
+
+# Stats panel text: where the time went by stage, the counters and the slowest files
+def stats_report():
+    summary = stats_summary()
+    total = sum(summary['stages_ms'].values()) or 1
+    lines = ["Time by stage"]
+    lines += [f"  {stage:<15}{ms:>12.1f} ms {ms / total:>7.1%}" for stage, ms in summary['stages_ms'].items()]
+    lines += ["", "Counters"]
+    lines += [f"  {name:<20}{count:>12}" for name, count in sorted(summary['counters'].items())]
+    lines += ["", "Slowest files"]
+    lines += [f"  {entry['ms']:>10.1f} ms  {display_name(entry['file'])}" for entry in summary['slowest_files']]
+    return '\n'.join(lines)
+
+# Stats button - shows the timings, with a button to save them as a trace
+def show_stats():
+    popup = tk.Toplevel(root)
+    popup.title("Scan Stats")
+    popup.geometry("600x500")
+
+    def refresh():
+        text_widget.config(state=tk.NORMAL)
+        text_widget.delete('1.0', tk.END)
+        text_widget.insert(tk.END, stats_report())
+        text_widget.config(state=tk.DISABLED)
+
+    def export():
+        path = filedialog.asksaveasfilename(title="Save Trace", defaultextension=".json", filetypes=[("JSON", "*.json")])
+        if path:
+            write_trace(path)
+            messagebox.showinfo("Stats", f"Trace saved to {path}")
+
+    button_row = tk.Frame(popup)
+    button_row.pack(side=tk.BOTTOM, pady=5)
+    tk.Button(button_row, text="Refresh", command=refresh).pack(side=tk.LEFT, padx=10)
+    tk.Button(button_row, text="Export Trace", command=export).pack(side=tk.LEFT, padx=10)
+    text_widget = tk.Text(popup, wrap=tk.NONE, font=("Courier", 10))
+    text_widget.pack(expand=True, fill=tk.BOTH)
+    refresh()
+
+# When double clicking on a file in the application
 def show_file_output(event):
-    clicked_widget = event.widget
-    clicked_widget.update_idletasks()
-    
-    # Retrieve file path associated with the clicked label
-    file_path = clicked_widget.path
+    # Rows are keyed by the file's full path
+    file_path = file_tree.identify_row(event.y)
+    if not file_path:
+        return
     
     # Extract file name and color
     file_name = os.path.basename(file_path)
-    file_color = clicked_widget.cget("fg")
+    file_color = file_entries[file_path]
     
+    if file_color == SCANNING_COLOR:
+        messagebox.showinfo("Info", "This file is still being scanned.")
+        return
+
     if file_color == 'green':
         messagebox.showinfo("Info", "This file does not contain any errors.")
         return
 
-    state_abbreviations = {abbrev for abbrev, name in state_data if name != selected_state}
-    state_names = {name for abbrev, name in state_data if name != selected_state}
-    output = find_states(file_path, state_abbreviations, state_names)
-    
-    # Check version and date match
-    title_version = extract_version_from_filename(file_name)
-    file_version, file_date = extract_version_and_date_from_file(file_path)
-    
-    version_mismatch_message = ""
-    if title_version and file_version and title_version != file_version:
-        version_mismatch_message = f"Version mismatch: Filename version ({title_version}) does not match file version ({file_version}).\n"
-    
-    missing_version_message = ""
-    if not title_version or not file_version:
-        missing_version_message = "Version number is missing in the filename or the file content.\n"
-    
-    if file_date:
-        try:
-            file_date_obj = parse_date(file_date)
-            current_date = datetime.now()
-            if abs((current_date - file_date_obj).days) > MAX_DATE_RANGE:
-                date_message = f"Date on file is not within {MAX_DATE_RANGE} days of current date: {file_date}\n"
-            else:
-                date_message = ""
-        except ValueError:
-            date_message = f"Invalid date format found in file: {file_date}\n"
-    else:
-        date_message = "No date found in the file.\n"
-    
-    if output:
-        output_text = f"{version_mismatch_message}{missing_version_message}{date_message}\n" + '\n'.join(output)
-    else:
-        output_text = f"{version_mismatch_message}{missing_version_message}{date_message}"
+    # The result the row's color came from. Without one the file is scanned again, the row turns back when it's done
+    result = file_results.get(file_path)
+    if result is None:
+        rescan_entry(file_path)
+        messagebox.showinfo("Info", "This file is being scanned again, open it when the scan is done.")
+        return
+    _, messages = check_file(file_name, result, selected_state)
+    # Only the hits are picked out here, findings are formatted a page at a time
+    findings = finding_hits(result, selected_state)
+    ignored = ignored_states_mask(selected_state)
+    page_count = max(1, -(-len(findings) // FINDINGS_PAGE_SIZE))
+    page = [0]
     
     # Create a popup window
     popup = tk.Toplevel(root)
-    popup.title(f"Output for {file_name}")
-    popup.geometry("600x400")
+    popup.title(f"Output for {display_name(file_path)}")
+    popup.geometry("700x550")
 
     # Position the popup relative to the root window
     root_x = root.winfo_x()
     root_y = root.winfo_y()
     popup.geometry(f"+{root_x+50}+{root_y+50}")
-    
-    # Add a Text widget to display the output
-    text_widget = tk.Text(popup, wrap=tk.WORD)
-    text_widget.pack(expand=True, fill=tk.BOTH)
-    text_widget.insert(tk.END, output_text)
-    text_widget.config(state=tk.DISABLED)
+
+    def show_page(number):
+        page[0] = number
+        page_findings = findings[number * FINDINGS_PAGE_SIZE:(number + 1) * FINDINGS_PAGE_SIZE]
+        finding_list.delete(0, tk.END)
+        finding_list.insert(tk.END, *(format_finding(hit, ignored) for hit in page_findings))
+        shown = f"{number * FINDINGS_PAGE_SIZE + 1}-{number * FINDINGS_PAGE_SIZE + len(page_findings)}" if page_findings else "0"
+        page_label.config(text=f"Findings {shown} of {len(findings)}")
+        previous_button.config(state=tk.NORMAL if number > 0 else tk.DISABLED)
+        next_button.config(state=tk.NORMAL if number + 1 < page_count else tk.DISABLED)
+
+    # Jump to the clicked finding and show the lines around it
+    def show_context(event):
+        selection = finding_list.curselection()
+        if not selection:
+            return
+        hit = findings[page[0] * FINDINGS_PAGE_SIZE + selection[0]]
+        try:
+            first, lines = line_context(file_path, result.line_index, hit.line_number)
+        except (OSError, KeyError, PdfError, *archive_errors()) as e:
+            messagebox.showerror("Error", f"Could not read {display_name(file_path)}: {e}")
+            return
+        context_text.config(state=tk.NORMAL)
+        context_text.delete('1.0', tk.END)
+        for line_number, line in enumerate(lines, first):
+            context_text.insert(tk.END, f"{line_number:>6}  {line}\n", 'hit' if line_number == hit.line_number else ())
+        context_text.config(state=tk.DISABLED)
+
+    # Reasons the file is red besides state mentions
+    if messages:
+        message_text = tk.Text(popup, wrap=tk.WORD, height=min(len(messages), 4) + 1)
+        message_text.pack(fill=tk.X)
+        message_text.insert(tk.END, ''.join(f"{message}\n" for message in messages))
+        message_text.config(state=tk.DISABLED)
+
+    page_row = tk.Frame(popup)
+    page_row.pack(fill=tk.X, pady=2)
+    previous_button = tk.Button(page_row, text="< Previous", command=lambda: show_page(page[0] - 1))
+    previous_button.pack(side=tk.LEFT, padx=10)
+    next_button = tk.Button(page_row, text="Next >", command=lambda: show_page(page[0] + 1))
+    next_button.pack(side=tk.RIGHT, padx=10)
+    page_label = tk.Label(page_row)
+    page_label.pack(side=tk.LEFT, expand=True)
+
+    list_frame = tk.Frame(popup)
+    list_frame.pack(expand=True, fill=tk.BOTH)
+    finding_list = tk.Listbox(list_frame, activestyle='none')
+    list_scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=finding_list.yview)
+    finding_list.config(yscrollcommand=list_scrollbar.set)
+    list_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+    finding_list.pack(side=tk.LEFT, expand=True, fill=tk.BOTH)
+    finding_list.bind("<<ListboxSelect>>", show_context)
+
+    context_text = tk.Text(popup, wrap=tk.NONE, height=2 * FINDING_CONTEXT_LINES + 1, font=("Courier", 10))
+    context_text.tag_configure('hit', background='yellow')
+    context_text.pack(fill=tk.X)
+    context_text.config(state=tk.DISABLED)
+    show_page(0)
 
 # Swapping between states
 def on_select(event):
@@ -176,111 +1767,33 @@ def on_select(event):
     new_state = state_combo.get()
     
     # Check if a state change is needed
-    if selected_state and new_state != selected_state:
-        # Confirm the state switch
-        result = messagebox.askyesno("Confirm State Change", f"Are you sure you want to switch from '{selected_state}' to '{new_state}'? \n\n This will remove all the files.")
-        if not result:
-            # User cancelled the change, revert to previous state
-            state_combo.set(selected_state)
-            return
-        else:
-            # User agreed, remove all files
-            for widget in file_list_frame.winfo_children():
-                if isinstance(widget, tk.Frame):
-                    widget.destroy()
-            # Update the state of the upload button
-            update_upload_button_state()
+    if new_state == selected_state:
+        return
     
     # Update the selected state
     selected_state = new_state
     previous_state = new_state
 
+    # Files were scanned against every state, so they are recoloured from their results without reading them again.
+    # Ignored files are checked again too since they were ignored for the previous state
+    for file_path, color in file_entries.items():
+        if color != SCANNING_COLOR:
+            set_entry_color(file_path, check_file(os.path.basename(file_path), file_results[file_path], selected_state)[0])
+    update_upload_button_state()
+
 # Using Select File button for file upload
 def select_files():
     if not selected_state:
         messagebox.showinfo("Info", "Please select a state.")
         return
 
-    global current_directory
     file_paths = filedialog.askopenfilenames(
         title="Select Files",
-        filetypes=[("Text Files", "*.txt")],
+        filetypes=[("Release Notes", "*.txt *.pdf *.zip *.tar *.tar.gz *.tgz"), ("Text Files", "*.txt"), ("Fortify Reports", "*.pdf")],
         defaultextension=".txt"
     )
     
-    if selected_state:
-        state_abbreviations = {abbrev for abbrev, name in state_data if name != selected_state}
-        state_names = {name for abbrev, name in state_data if name != selected_state}
-
-        for file_path in file_paths:
-            file_name = os.path.basename(file_path)
-            current_directory = os.path.dirname(file_path)
-            
-            # Check if the file already exists in the list
-            existing_frame = None
-            for child in file_list_frame.winfo_children():
-                if isinstance(child, tk.Frame):
-                    label = child.winfo_children()[0]  # Assuming label is the first child
-                    if file_name in label.cget("text"):
-                        existing_frame = child
-                        break
-
-            has_state = find_states(file_path, state_abbreviations, state_names)
-            
-            # Extract version and date information
-            title_version = extract_version_from_filename(file_name)
-            file_version, file_date = extract_version_and_date_from_file(file_path)
-            
-            # Determine file color
-            if title_version and file_version and title_version == file_version:
-                if file_date:
-                    try:
-                        file_date_obj = parse_date(file_date)
-                        current_date = datetime.now()
-                        color = 'green' if abs((current_date - file_date_obj).days) <= MAX_DATE_RANGE and not has_state else 'red'
-                    except ValueError:
-                        color = 'red'  # Invalid date format
-                else:
-                    color = 'red'  # Missing date
-            else:
-                color = 'red'
-            
-            # Update existing entry or add a new one
-            if existing_frame:
-                # Update existing entry
-                existing_frame.winfo_children()[0].config(fg=color)
-
-                # Remove ignore button if file turns green
-                if color == 'green':
-                    for widget in existing_frame.winfo_children():
-                        if isinstance(widget, tk.Button) and widget.cget('text') == 'Ignore':
-                            widget.destroy()
-                            break
-            else:
-                # Add new entry
-                file_frame = tk.Frame(file_list_frame)
-                file_frame.pack(fill=tk.X, padx=5, pady=2)
-
-                # Create label for file name
-                file_label = tk.Label(file_frame, text=file_name, fg=color, padx=10, anchor='w')
-                file_label.path = file_path
-                file_label.pack(side=tk.LEFT, fill=tk.X, expand=True)
-                file_label.bind("<Button-1>", show_file_output)
-                
-                # Create remove button
-                remove_button = tk.Button(file_frame, text="Remove", command=lambda f=file_frame: remove_file_entry(f))
-                remove_button.pack(side=tk.RIGHT)
-                
-                # Create ignore button if the file is red
-                if color == 'red':
-                    ignore_button = tk.Button(file_frame, text="Ignore", command=lambda f=file_frame: ignore_file_entry(f))
-                    ignore_button.pack(side=tk.RIGHT)
-
-        # Update the state of the upload button
-        update_upload_button_state()
-
-    else:
-        messagebox.showinfo("Info", "Please select a State.")
+    add_files(file_paths)
 
 # Using drag n drop for file upload
 def on_drop(event):
@@ -288,7 +1801,6 @@ def on_drop(event):
         messagebox.showinfo("Info", "Please select a state.")
         return
 
-    global current_directory
     file_paths = event.data.split('}')
     
     # Clean up paths and remove empty strings
@@ -302,114 +1814,459 @@ def on_drop(event):
     # Handle paths that still have '{' at the start
     complete_file_paths = [fp if not fp.startswith('{') else fp[1:] for fp in file_paths]
     
-    if selected_state:
-        state_abbreviations = {abbrev for abbrev, name in state_data if name != selected_state}
-        state_names = {name for abbrev, name in state_data if name != selected_state}
-
-        for file_path in complete_file_paths:
-            file_name = os.path.basename(file_path)
-            current_directory = os.path.dirname(file_path)
-            
-            # Check if the file already exists in the list
-            existing_frame = None
-            for child in file_list_frame.winfo_children():
-                if isinstance(child, tk.Frame):
-                    label = child.winfo_children()[0]  # Assuming label is the first child
-                    if file_name in label.cget("text"):
-                        existing_frame = child
-                        break
-
-            has_state = find_states(file_path, state_abbreviations, state_names)
-            
-            # Extract version and date information
-            title_version = extract_version_from_filename(file_name)
-            file_version, file_date = extract_version_and_date_from_file(file_path)
-            
-            # Determine file color
-            if title_version and file_version and title_version == file_version:
-                if file_date:
-                    try:
-                        file_date_obj = parse_date(file_date)
-                        current_date = datetime.now()
-                        color = 'green' if abs((current_date - file_date_obj).days) <= MAX_DATE_RANGE and not has_state else 'red'
-                    except ValueError:
-                        color = 'red'  # Invalid date format
-                else:
-                    color = 'red'  # Missing date
-            else:
-                color = 'red'
-            
-            # Update existing entry or add a new one
-            if existing_frame:
-                # Update existing entry
-                existing_frame.winfo_children()[0].config(fg=color)
-
-                # Remove ignore button if file turns green
-                if color == 'green':
-                    for widget in existing_frame.winfo_children():
-                        if isinstance(widget, tk.Button) and widget.cget('text') == 'Ignore':
-                            widget.destroy()
-                            break
-            else:
-                # Add new entry
-                file_frame = tk.Frame(file_list_frame)
-                file_frame.pack(fill=tk.X, padx=5, pady=2)
-
-                # Create label for file name
-                file_label = tk.Label(file_frame, text=file_name, fg=color, padx=10, anchor='w')
-                file_label.path = file_path
-                file_label.pack(side=tk.LEFT, fill=tk.X, expand=True)
-                file_label.bind("<Button-1>", show_file_output)
-                
-                # Create remove button
-                remove_button = tk.Button(file_frame, text="Remove", command=lambda f=file_frame: remove_file_entry(f))
-                remove_button.pack(side=tk.RIGHT)
-                
-                # Create ignore button if the file is red
-                if color == 'red':
-                    ignore_button = tk.Button(file_frame, text="Ignore", command=lambda f=file_frame: ignore_file_entry(f))
-                    ignore_button.pack(side=tk.RIGHT)
+    add_files(complete_file_paths)
 
-        # Update the state of the upload button
+# Add the files to the list straight away and scan them in the background, or update the entry if the file is already there
+def add_files(file_paths):
+    global current_directory
+
+    # Forget scans that already finished
+    pending_scans.difference_update([future for future in pending_scans if future.done()])
+
+    for file_path in file_paths:
+        file_path = absolute_path(file_path)
+        current_directory = os.path.dirname(split_archive_path(file_path)[0])
+
+        # Archives get a row for each release note inside them as they are read
+        if is_archive(file_path):
+            threading.Thread(target=expand_archive_in_background, args=(file_path, scan_generation), name="archive", daemon=True).start()
+            continue
+
+        # Rows are keyed by full path, so the same name in two folders gets two rows
+        with timed_stage(file_path, 'widgets'):
+            if file_path not in file_entries:
+                file_tree.insert('', tk.END, iid=file_path, text=display_name(file_path))
+                watch_file(file_path, file_path)
+            rescan_entry(file_path)
+
+    # Update the state of the upload button
+    update_upload_button_state()
+
+# Scan a listed file again. It is hashed first so a copy of a file that is already listed isn't scanned twice,
+# the row turns red or green when finish_scan receives the result
+def rescan_entry(file_path):
+    leave_content_group(file_path)
+    file_results.pop(file_path, None)
+    set_entry_color(file_path, SCANNING_COLOR)
+    future = get_scan_executor().submit(hash_in_background, file_path, scan_generation)
+    pending_scans.add(future)
+
+# Runs on a worker thread - hashes a listed file and hands it to the UI thread to be grouped with its copies. The first copy of
+# some content to be hashed is scanned right here, from the data read for the hash when there is some, the others wait for its result
+def hash_in_background(file_path, generation):
+    # Cancelled while it was queued
+    if generation != scan_generation:
+        return
+    try:
+        with timed_stage(file_path, 'hash'):
+            content_digest, data = listed_content_digest(file_path)
+    except (OSError, KeyError, *archive_errors()):
+        content_digest = data = None
+    if content_digest is None:
+        # Scanned on its own, the scan reports why it can't be read
+        scan_in_background(file_path, generation)
+        return
+
+    # The content is claimed and the group join queued in one step, so the join of the copy that is scanned reaches the UI thread
+    # before any other copy's
+    with content_scans_lock:
+        scanning = content_scans.get(content_digest) != generation
+        content_scans[content_digest] = generation
+        post_to_ui(join_content_group, generation, file_path, content_digest, scanning)
+    if scanning:
+        scan_in_background(file_path, generation, data, content_digest)
+
+# Put a hashed file in the group for its content. The copy being scanned hands its result to the group in finish_scan, the others
+# take the result of a copy already scanned. When there is none and no other copy is listed any more, this one is scanned after all
+def join_content_group(generation, file_path, content_digest, scanning):
+    if generation != scan_generation or file_path not in file_entries:
+        return
+    members = content_groups.setdefault(content_digest, [])
+    members.append(file_path)
+    entry_digests[file_path] = content_digest
+    show_content_group(content_digest)
+    if scanning:
+        return
+    result = next((file_results[member] for member in members if member in file_results), None)
+    if result is not None:
+        cache_scan_result(file_path, result)
+        apply_scan_result(file_path, result)
         update_upload_button_state()
+    elif len(members) == 1:
+        pending_scans.add(get_scan_executor().submit(scan_in_background, file_path, generation, None, content_digest))
+    # Otherwise a copy is still being scanned and finish_scan hands its result to this one too
+
+# Take a file out of its content group, for instance because it changed on disk
+def leave_content_group(file_path):
+    content_digest = entry_digests.pop(file_path, None)
+    if content_digest is None:
+        return
+    members = content_groups[content_digest]
+    members.remove(file_path)
+    if members:
+        show_content_group(content_digest)
     else:
-        messagebox.showinfo("Info", "Please select a State.")
-
-# Ignore file button
-def ignore_file_entry(frame):
-    # Find the text from the relevant widget in the frame
-    file_text = ""
-    for widget in frame.winfo_children():
-        if isinstance(widget, tk.Label):
-            file_text = widget.cget("text")
-            break
+        del content_groups[content_digest]
+    file_tree.set(file_path, 'group', '')
+
+# Show which rows have the same content, every copy gets the same group number
+def show_content_group(content_digest):
+    members = content_groups.get(content_digest, ())
+    if len(members) < 2:
+        label = ''
+    else:
+        if content_digest not in content_group_numbers:
+            content_group_numbers[content_digest] = next(content_group_counter)
+        label = f"#{content_group_numbers[content_digest]} ({len(members)} copies)"
+    for member in members:
+        file_tree.set(member, 'group', label)
+
+# Add a row for a release note found in an archive, the scan is already queued
+def add_archive_member(generation, file_path, content_digest):
+    if generation != scan_generation:
+        return
+    if file_path not in file_entries:
+        file_tree.insert('', tk.END, iid=file_path, text=display_name(file_path))
+        watch_file(split_archive_path(file_path)[0], file_path)
+    leave_content_group(file_path)
+    file_results.pop(file_path, None)
+    set_entry_color(file_path, SCANNING_COLOR)
+    join_content_group(generation, file_path, content_digest, True)
+    update_upload_button_state()
+
+# Remove the rows of an archive's members other than the ones just read from it
+def remove_archive_members(generation, archive_path, member_paths):
+    if generation != scan_generation:
+        return
+    with watch_lock:
+        listed = set(watched_files.get(archive_path, ()))
+    for file_path in listed - member_paths:
+        if file_path in file_entries:
+            remove_entry(file_path)
+    update_upload_button_state()
+
+# Runs on its own thread - reads the release notes out of an archive one after another and hands each to the scan pool,
+# so the archive is read once and never extracted to disk while its members are scanned in parallel
+def expand_archive_in_background(archive_path, generation):
+    read_ahead = threading.BoundedSemaphore(ARCHIVE_READ_AHEAD)
+    member_paths = set()
+    try:
+        for member, data in iter_archive_members(archive_path):
+            if generation != scan_generation:
+                return
+            file_path = archive_member_path(archive_path, member)
+            member_paths.add(file_path)
+            content_digest = hashlib.blake2b(data, digest_size=20).hexdigest()
+            # The member is scanned either way since its content is already read. The row is queued before the scan so it exists
+            # when the result arrives, and the claim keeps copies of the member on disk from being scanned too
+            with content_scans_lock:
+                content_scans[content_digest] = generation
+                post_to_ui(add_archive_member, generation, file_path, content_digest)
+            read_ahead.acquire()
+            future = get_scan_executor().submit(scan_in_background, file_path, generation, data, content_digest)
+            future.add_done_callback(lambda _: read_ahead.release())
+    except Exception as e:
+        print(f"Error reading archive '{archive_path}': {e}")
+        post_to_ui(messagebox.showerror, "Archive Error", f"Could not read '{os.path.basename(archive_path)}': {e}")
+        return
+    # When a changed archive is read again, members taken out of it lose their rows
+    post_to_ui(remove_archive_members, generation, archive_path, member_paths)
+    if not member_paths:
+        post_to_ui(messagebox.showinfo, "Info", f"No release notes ({ARCHIVE_MEMBER_PATTERN}) found in '{os.path.basename(archive_path)}'.")
+
+# Set the colour of a file entry and keep the per colour counts in step
+def set_entry_color(file_path, color):
+    old_color = file_entries.get(file_path)
+    if old_color:
+        color_counts[old_color] -= 1
+    color_counts[color] += 1
+    file_entries[file_path] = color
+    file_tree.set(file_path, 'status', STATUS_TEXT[color])
+    file_tree.item(file_path, tags=(color,))
+
+# Show some other status for a file, like upload progress, without changing its colour
+def set_entry_status(file_path, status):
+    if file_path in file_entries:
+        file_tree.set(file_path, 'status', status)
+
+# Take a file out of the list
+def remove_entry(file_path):
+    leave_content_group(file_path)
+    unwatch_file(split_archive_path(file_path)[0], file_path)
+    color_counts[file_entries.pop(file_path)] -= 1
+    file_results.pop(file_path, None)
+    file_tree.delete(file_path)
+
+# Take every file out of the list and stop scanning
+def clear_file_entries():
+    global content_group_counter
+    cancel_scans()
+    unwatch_all_files()
+    file_tree.delete(*file_tree.get_children())
+    file_entries.clear()
+    file_results.clear()
+    color_counts.clear()
+    content_groups.clear()
+    entry_digests.clear()
+    content_group_numbers.clear()
+    content_group_counter = itertools.count(1)
+    with content_scans_lock:
+        content_scans.clear()
+    # Update the state of the upload button
+    update_upload_button_state()
+
+# Thread pool for scanning, created on first use
+def get_scan_executor():
+    global scan_executor
+    if scan_executor is None:
+        from concurrent.futures import ThreadPoolExecutor
+        scan_executor = ThreadPoolExecutor(max_workers=SCAN_WORKERS, thread_name_prefix="scan")
+    return scan_executor
+
+# Runs on a worker thread - never touch widgets here, hand the result to the UI thread instead
+def scan_in_background(file_path, generation, data=None, content_digest=None):
+    # Cancelled while it was queued
+    if generation != scan_generation:
+        return
+    try:
+        result = profiled(cached_scan_file, file_path, data, content_digest)
+    except Exception as e:
+        print(f"Error scanning file '{file_path}': {e}")
+        result = ScanResult([], (0,), None, None, 0, None, error=e)
+    post_to_ui(finish_scan, generation, file_path, result, content_digest)
+
+# Colour the rows once a scan is done, unless the scan was cancelled. The result goes to every listed copy of the content,
+# even when the row it was scanned for was removed or changed meanwhile
+def finish_scan(generation, file_path, result, content_digest=None):
+    if generation != scan_generation:
+        return
+    if content_digest is None:
+        members = [file_path] if file_path in file_entries else []
+    else:
+        members = list(content_groups.get(content_digest, ()))
+    for member in members:
+        if member != file_path:
+            cache_scan_result(member, result)
+        apply_scan_result(member, result)
+    update_upload_button_state()
+    update_cache_status()
+
+# Keep a file's scan result and colour its row. Copies share a result but are checked against their own file names
+def apply_scan_result(file_path, result):
+    file_results[file_path] = result
+    with timed_stage(file_path, 'verdict'):
+        color, _ = check_file(os.path.basename(file_path), result, selected_state)
+    with timed_stage(file_path, 'widgets'):
+        set_entry_color(file_path, color)
+
+# Drop every queued scan and ignore results of the ones already running
+def cancel_scans():
+    global scan_generation
+    scan_generation += 1
+    for future in pending_scans:
+        future.cancel()
+    pending_scans.clear()
+
+# Queue a call to run on the Tk thread
+def post_to_ui(func, *args):
+    ui_queue.put((func, args))
+
+# Run whatever the worker threads queued, Tk widgets must only be used from the mainloop thread
+def poll_ui_queue():
+    try:
+        while True:
+            func, args = ui_queue.get_nowait()
+            func(*args)
+    except queue.Empty:
+        pass
+    root.after(UI_POLL_MS, poll_ui_queue)
+
+# Modification time and size of a file, None once it's gone
+def stat_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+# Start watching listed files for changes, with inotify on Linux and polling for anything inotify can't cover
+def start_file_watcher():
+    global inotify_libc, inotify_fd
+    if sys.platform.startswith('linux'):
+        import ctypes
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+            inotify_libc, inotify_fd = libc, fd
+            threading.Thread(target=watch_inotify_in_background, name="watch", daemon=True).start()
+        except (OSError, AttributeError) as e:
+            print(f"Could not use inotify, polling files for changes instead: {e}")
+    threading.Thread(target=poll_files_in_background, name="watch-poll", daemon=True).start()
+
+# Watch a file on disk for a listed entry. Folders are watched rather than files so editors that save by renaming are caught too
+def watch_file(disk_path, file_path):
+    with watch_lock:
+        if disk_path in watched_files:
+            watched_files[disk_path].add(file_path)
+            return
+        watched_files[disk_path] = {file_path}
+        folder = os.path.dirname(disk_path)
+        if inotify_fd is not None and folder not in watch_descriptors:
+            descriptor = inotify_libc.inotify_add_watch(inotify_fd, os.fsencode(folder), WATCH_MASK)
+            if descriptor >= 0:
+                watch_descriptors[folder] = descriptor
+                watch_folders[descriptor] = folder
+            else:
+                # Usually the inotify watch limit, the file is polled instead
+                import ctypes
+                print(f"Could not watch '{folder}', polling it instead: {os.strerror(ctypes.get_errno())}")
+        if folder in watch_descriptors:
+            watch_folder_counts[folder] += 1
+        else:
+            polled_files[disk_path] = stat_signature(disk_path)
+
+# Stop watching a file on disk for a listed entry, the folder watch goes once none of its files are listed
+def unwatch_file(disk_path, file_path):
+    with watch_lock:
+        entries = watched_files.get(disk_path)
+        if entries is None:
+            return
+        entries.discard(file_path)
+        if entries:
+            return
+        del watched_files[disk_path]
+        if polled_files.pop(disk_path, False) is not False:
+            return
+        folder = os.path.dirname(disk_path)
+        watch_folder_counts[folder] -= 1
+        if watch_folder_counts[folder] <= 0:
+            del watch_folder_counts[folder]
+            descriptor = watch_descriptors.pop(folder, None)
+            if descriptor is not None:
+                del watch_folders[descriptor]
+                inotify_libc.inotify_rm_watch(inotify_fd, descriptor)
 
-    # Confirm ignoring the file with the frame's text
+# Stop watching everything
+def unwatch_all_files():
+    with watch_lock:
+        for descriptor in watch_folders:
+            inotify_libc.inotify_rm_watch(inotify_fd, descriptor)
+        watched_files.clear()
+        watch_descriptors.clear()
+        watch_folders.clear()
+        watch_folder_counts.clear()
+        polled_files.clear()
+
+# Events waiting on the inotify descriptor as (watch descriptor, mask, file name)
+def read_inotify_events():
+    events = []
+    while True:
+        try:
+            data = os.read(inotify_fd, 64 * 1024)
+        except BlockingIOError:
+            return events
+        offset = 0
+        while offset < len(data):
+            descriptor, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            events.append((descriptor, mask, name))
+
+# Runs on its own thread - collects changed listed files from inotify and hands them to the UI thread once events stop for a moment.
+# Only files that changed are looked at, so the work doesn't grow with the number of files in the list
+def watch_inotify_in_background():
+    changed = set()
+    while True:
+        readable, _, _ = select.select([inotify_fd], [], [], WATCH_DEBOUNCE if changed else None)
+        if not readable:
+            post_to_ui(rescan_changed_files, changed)
+            changed = set()
+            continue
+        with watch_lock:
+            for descriptor, mask, name in read_inotify_events():
+                if mask & IN_Q_OVERFLOW:
+                    # Events were lost, check every watched file
+                    changed.update(disk_path for disk_path in watched_files if disk_path not in polled_files)
+                elif mask & IN_IGNORED:
+                    # The folder itself was deleted or unmounted
+                    folder = watch_folders.pop(descriptor, None)
+                    watch_descriptors.pop(folder, None)
+                elif descriptor in watch_folders:
+                    disk_path = os.path.join(watch_folders[descriptor], name)
+                    if disk_path in watched_files:
+                        changed.add(disk_path)
+
+# Runs on its own thread - checks the files inotify doesn't cover. A change is reported once the file has stayed the same for a whole poll
+def poll_files_in_background():
+    settling = {}
+    while True:
+        time.sleep(WATCH_POLL_SECONDS)
+        with watch_lock:
+            files = list(polled_files.items())
+        changed = set()
+        for disk_path, signature in files:
+            current = stat_signature(disk_path)
+            if current == signature:
+                settling.pop(disk_path, None)
+            elif settling.get(disk_path, False) == current:
+                # A deleted file has no signature, hence False for files that aren't settling
+                del settling[disk_path]
+                changed.add(disk_path)
+                with watch_lock:
+                    if disk_path in polled_files:
+                        polled_files[disk_path] = current
+            else:
+                settling[disk_path] = current
+        if changed:
+            post_to_ui(rescan_changed_files, changed)
+
+# Scan the entries of changed files again. An archive that changed is read again so members added to it show up too
+def rescan_changed_files(disk_paths):
+    pending_scans.difference_update([future for future in pending_scans if future.done()])
+    with watch_lock:
+        changed = {disk_path: set(watched_files.get(disk_path, ())) for disk_path in disk_paths}
+    for disk_path, file_paths in changed.items():
+        if is_archive(disk_path) and file_paths:
+            add_files([disk_path])
+            continue
+        for file_path in file_paths:
+            if file_path in file_entries:
+                rescan_entry(file_path)
+    update_upload_button_state()
+
+# Ignore button - marks the selected red files as ignored
+def ignore_file_entry():
+    file_paths = [file_path for file_path in file_tree.selection() if file_entries[file_path] == 'red']
+    if not file_paths:
+        messagebox.showinfo("Info", "Please select a red file to ignore.")
+        return
+
+    # Confirm ignoring the files
+    file_text = display_name(file_paths[0]) if len(file_paths) == 1 else f"{len(file_paths)} files"
     result = messagebox.askyesno("Confirm Ignore", f"Are you sure you want to ignore the file '{file_text}'?")
     if result:
-        # Mark the file entry as ignored by changing its color or text
-        for widget in frame.winfo_children():
-            if isinstance(widget, tk.Label):
-                widget.config(fg='orange')
-            if isinstance(widget, tk.Button) and widget.cget('text') == 'Ignore':
-                widget.destroy()
-                break
+        # Mark the file entry as ignored by changing its color
+        for file_path in file_paths:
+            set_entry_color(file_path, 'orange')
         # Update the state of the upload button
         update_upload_button_state()
 
-# Remove file button
-def remove_file_entry(frame):
-    # Find the text from the relevant widget in the frame
-    file_text = ""
-    for widget in frame.winfo_children():
-        if isinstance(widget, tk.Label):
-            file_text = widget.cget("text")
-            break
+# Remove button - removes the selected files
+def remove_file_entry():
+    file_paths = file_tree.selection()
+    if not file_paths:
+        return
 
-    # Confirm deleting the file with the frame's text
+    # Confirm deleting the files
+    file_text = display_name(file_paths[0]) if len(file_paths) == 1 else f"{len(file_paths)} files"
     result = messagebox.askyesno("Confirm Remove", f"Are you sure you want to remove the file '{file_text}'?")
     if result:
-        frame.destroy()
+        for file_path in file_paths:
+            remove_entry(file_path)
         # Update the state of the upload button
         update_upload_button_state()
 
@@ -418,32 +2275,299 @@ def remove_all_files():
     # Confirm removing all the files
     result = messagebox.askyesno("Confirm Celar All", f"Are you sure you want to remove all the files?")
     if result:
-        for widget in file_list_frame.winfo_children():
-            if isinstance(widget, tk.Frame):
-                widget.destroy()
-        # Update the state of the upload button
+        clear_file_entries()
+
+# Raised when a file can't be uploaded to Artifactory after retrying
+class UploadError(Exception):
+    pass
+
+# SHA-1, SHA-256 and MD5 of a file in one streaming read
+def file_checksums(file_path):
+    sha1, sha256, md5 = hashlib.sha1(), hashlib.sha256(), hashlib.md5()
+    with open_source(file_path) as file:
+        for chunk in iter(lambda: file.read(UPLOAD_CHUNK_SIZE), b''):
+            sha1.update(chunk)
+            sha256.update(chunk)
+            md5.update(chunk)
+    return sha1.hexdigest(), sha256.hexdigest(), md5.hexdigest()
+
+# Keep-alive connection to Artifactory for the current upload thread, so each worker reuses one connection for all its files
+def artifactory_connection(reset=False):
+    import http.client
+    import urllib.parse
+    connection = getattr(upload_connections, 'connection', None)
+    if connection and reset:
+        connection.close()
+        connection = None
+    if connection is None:
+        url = urllib.parse.urlsplit(ARTIFACTORY_URL)
+        connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        connection = connection_class(url.netloc, timeout=UPLOAD_TIMEOUT)
+        upload_connections.connection = connection
+    return connection
+
+# Send one PUT to Artifactory, streaming the file body when one is given and reporting how many bytes went out
+def artifactory_put(target_path, headers, file_path=None, progress=None):
+    import http.client
+    import urllib.parse
+    url = urllib.parse.urlsplit(ARTIFACTORY_URL)
+    headers = dict(headers)
+    if ARTIFACTORY_TOKEN:
+        headers['Authorization'] = f"Bearer {ARTIFACTORY_TOKEN}"
+    headers['Content-Length'] = str(source_size(file_path) if file_path else 0)
+
+    connection = artifactory_connection()
+    try:
+        connection.putrequest('PUT', url.path.rstrip('/') + '/' + urllib.parse.quote(target_path))
+        for name, value in headers.items():
+            connection.putheader(name, value)
+        connection.endheaders()
+        if file_path:
+            sent = 0
+            with open_source(file_path) as file:
+                for chunk in iter(lambda: file.read(UPLOAD_CHUNK_SIZE), b''):
+                    connection.send(chunk)
+                    sent += len(chunk)
+                    if progress:
+                        progress(sent)
+        response = connection.getresponse()
+        body = response.read()
+        return response.status, body
+    except (OSError, http.client.HTTPException):
+        # Drop the broken connection so the retry opens a new one
+        artifactory_connection(reset=True)
+        raise
+
+# Upload a file to Artifactory. A checksum deploy is tried first so files the server already has are never sent again.
+# Returns 'deployed' when the server already had the content, or 'uploaded'
+def upload_to_artifactory(file_path, target_path, progress=None):
+    import http.client
+    import random
+    sha1, sha256, md5 = file_checksums(file_path)
+    checksum_headers = {'X-Checksum-Sha1': sha1, 'X-Checksum-Sha256': sha256, 'X-Checksum': md5}
+
+    for attempt in range(UPLOAD_RETRIES + 1):
+        try:
+            status, body = artifactory_put(target_path, dict(checksum_headers, **{'X-Checksum-Deploy': 'true'}))
+            if status in (200, 201):
+                return 'deployed'
+            # 404 means the server doesn't have this content yet
+            if status == 404:
+                status, body = artifactory_put(target_path, checksum_headers, file_path, progress)
+                if status in (200, 201):
+                    return 'uploaded'
+            error = f"HTTP {status}: {body[:200].decode('utf8', errors='ignore')}"
+            # Only server errors and throttling are worth retrying
+            if status < 500 and status != 429:
+                raise UploadError(error)
+        except (OSError, http.client.HTTPException) as e:
+            error = str(e)
+        if attempt < UPLOAD_RETRIES:
+            time.sleep(UPLOAD_BACKOFF * 2 ** attempt * (1 + random.random() / 2))
+    raise UploadError(error)
+
+# Runs on an upload thread, progress and the outcome are handed to the UI thread
+def upload_in_background(file_path, target_path):
+    size = source_size(file_path) or 1
+    last_percent = -1
+
+    # Only post every 5% so a fast upload doesn't flood the UI queue
+    def progress(sent):
+        nonlocal last_percent
+        percent = sent * 100 // size
+        if percent // 5 != last_percent // 5:
+            last_percent = percent
+            post_to_ui(set_entry_status, file_path, f"Uploading {percent}%")
+
+    try:
+        outcome = upload_to_artifactory(file_path, target_path, progress)
+        post_to_ui(finish_upload, file_path, "Already on server" if outcome == 'deployed' else "Uploaded", None)
+    except Exception as e:
+        post_to_ui(finish_upload, file_path, "Upload failed", e)
+
+# Show the upload outcome on the row, and a summary once every file is done
+def finish_upload(file_path, status, error):
+    global uploads_pending
+    set_entry_status(file_path, status)
+    upload_outcomes[status] = upload_outcomes.get(status, 0) + 1
+    if error:
+        upload_errors.append(f"{display_name(file_path)}: {error}")
+
+    uploads_pending -= 1
+    if uploads_pending == 0:
+        summary = '\n'.join(f"{status}: {count}" for status, count in sorted(upload_outcomes.items()))
+        if upload_errors:
+            messagebox.showerror("Upload Finished With Errors", summary + "\n\n" + '\n'.join(upload_errors[:20]))
+        else:
+            messagebox.showinfo("Upload Successful", f"The files were successfully uploaded to MGMT-{upload_mgmt}.\n\n{summary}")
         update_upload_button_state()
 
-# TODO - Upload to artifactory button
+# Upload to artifactory button
 def upload_files():
-    mgmt_textbox_content = mgmt_textbox.get()  # Get the content from the mgmt_textbox
+    mgmt_textbox_content = mgmt_textbox.get().strip()  # Get the content from the mgmt_textbox
 
-    if re.search(r'\d', mgmt_textbox_content):
-        # Ask for confirmation if numbers are found
-        result = messagebox.askyesno("Confirm Upload", f"Do you want to upload to MGMT-{mgmt_textbox_content}? \n (This hasn't actually been implemented)")
-        if result:
-            # Show a confirmation message after successful upload
-            messagebox.showinfo("Upload Successful", f"The files were successfully uploaded to MGMT-{mgmt_textbox_content}. \n (This hasn't actually been implemented)")
+    # Only a number, it becomes part of the upload path so something like 1/../../other-repo must not get through
+    if re.fullmatch(r'\d+', mgmt_textbox_content):
+        if not ARTIFACTORY_URL:
+            messagebox.showerror("Artifactory", "Set ARTIFACTORY_URL (and ARTIFACTORY_TOKEN) before uploading.")
             return
 
+        # Ask for confirmation before uploading
+        result = messagebox.askyesno("Confirm Upload", f"Do you want to upload to MGMT-{mgmt_textbox_content}?")
+        if result:
+            # Red files can't get here since the button is disabled while there are any
+            global upload_executor, uploads_pending, upload_mgmt
+            file_paths = [file_path for file_path, color in file_entries.items() if color in ('green', 'orange')]
+            upload_outcomes.clear()
+            upload_errors.clear()
+            target_paths = {}
+            for file_path in file_paths:
+                target_path = f"{ARTIFACTORY_REPO}/MGMT-{mgmt_textbox_content}/{os.path.basename(file_path)}"
+                # Two listed files with the same name would overwrite each other on the server
+                if target_path in target_paths:
+                    set_entry_status(file_path, "Upload failed")
+                    upload_outcomes["Upload failed"] = upload_outcomes.get("Upload failed", 0) + 1
+                    upload_errors.append(f"{display_name(file_path)}: another file with the same name is being uploaded")
+                else:
+                    target_paths[target_path] = file_path
+            uploads_pending = len(target_paths)
+            upload_mgmt = mgmt_textbox_content
+            upload_button.config(state=tk.DISABLED)
+
+            if upload_executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                upload_executor = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="upload")
+            for target_path, file_path in target_paths.items():
+                set_entry_status(file_path, "Queued")
+                upload_executor.submit(upload_in_background, file_path, target_path)
+
     else:
-        # Show an error message if no numbers are found
+        # Show an error message if it isn't a number
         messagebox.showerror("Input Error", "Please input a valid MGMT number.")
 
+# Streaming BLAKE2 hash of a file's content
+def content_hash(file_path):
+    digest = hashlib.blake2b(digest_size=20)
+    with open_source(file_path) as file:
+        for chunk in iter(lambda: file.read(EXPORT_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Check whether the destination already has this exact file: same size and time is enough, otherwise the content is compared
+def export_is_current(src_path, dest_path, src_stat):
+    try:
+        dest_stat = os.stat(dest_path)
+    except FileNotFoundError:
+        return False
+    if dest_stat.st_size != src_stat.st_size:
+        return False
+    if dest_stat.st_mtime_ns == src_stat.st_mtime_ns:
+        return True
+    if content_hash(src_path) != content_hash(dest_path):
+        return False
+    # Same content, line the times up so the next export skips it without hashing
+    os.utime(dest_path, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+    return True
+
+# Copy file contents between two open files in the kernel where the OS allows it, falling back to a normal copy
+def copy_file_contents(src_file, dest_file, size):
+    import shutil
+    copied = 0
+    for copy in ('copy_file_range', 'sendfile'):
+        if not hasattr(os, copy):
+            continue
+        try:
+            # copy_file_range is given offsets and leaves the file position alone, sendfile writes at the position
+            if copy == 'sendfile':
+                os.lseek(dest_file.fileno(), copied, os.SEEK_SET)
+            while copied < size:
+                if copy == 'copy_file_range':
+                    count = os.copy_file_range(src_file.fileno(), dest_file.fileno(), size - copied, copied, copied)
+                else:
+                    count = os.sendfile(dest_file.fileno(), src_file.fileno(), copied, size - copied)
+                if count == 0:
+                    break
+                copied += count
+            return
+        except OSError:
+            # Not supported between these file systems, try the next way from where this one stopped
+            continue
+    src_file.seek(copied)
+    dest_file.seek(copied)
+    shutil.copyfileobj(src_file, dest_file, EXPORT_CHUNK_SIZE)
+
+# Write a file through a temporary file next to it, so a half written file never appears under the real name.
+# The temporary file is created with the usual 0o666 less the umask, the mode and times of stat_path are copied over when given
+def write_file_atomically(dest_path, write, stat_path=None):
+    import shutil
+    temp_path = os.path.join(os.path.dirname(dest_path), f'.{os.path.basename(dest_path)}.{os.urandom(6).hex()}.part')
+    temp_fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+    try:
+        with os.fdopen(temp_fd, 'wb') as dest_file:
+            write(dest_file)
+        if stat_path:
+            shutil.copystat(stat_path, temp_path)
+        os.replace(temp_path, dest_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+# Copy one file into the destination folder, unless it's already there
+def export_file(src_path, dest_path):
+    archive_path, member = split_archive_path(src_path)
+    if member is not None:
+        return export_archive_member(archive_path, member, dest_path)
+
+    src_stat = os.stat(src_path)
+    if export_is_current(src_path, dest_path, src_stat):
+        return 'skipped'
+    with open(src_path, 'rb') as src_file:
+        write_file_atomically(dest_path, lambda dest_file: copy_file_contents(src_file, dest_file, src_stat.st_size), src_path)
+    return 'copied'
+
+# Write a release note from an archive into the destination folder. Members have no time of their own to compare, so content decides
+def export_archive_member(archive_path, member, dest_path):
+    data = read_archive_member(archive_path, member)
+    if os.path.isfile(dest_path) and os.path.getsize(dest_path) == len(data) and content_hash(dest_path) == hashlib.blake2b(data, digest_size=20).hexdigest():
+        return 'skipped'
+    write_file_atomically(dest_path, lambda dest_file: dest_file.write(data))
+    return 'copied'
+
+# Copy files into a folder in parallel, skipping ones already there. Returns the copied, skipped and failed files
+def export_files(file_paths, dest_folder):
+    from concurrent.futures import ThreadPoolExecutor
+    report = {'copied': [], 'skipped': [], 'failed': []}
+    dest_paths = {}
+    for src_path in file_paths:
+        dest_path = os.path.join(dest_folder, os.path.basename(src_path))
+        # Two listed files with the same name would overwrite each other
+        if dest_path in dest_paths:
+            report['failed'].append((src_path, "another file with the same name is being exported"))
+        else:
+            dest_paths[dest_path] = src_path
+
+    with ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export") as executor:
+        futures = {executor.submit(export_file, src_path, dest_path): src_path for dest_path, src_path in dest_paths.items()}
+        for future in futures:
+            try:
+                report[future.result()].append(futures[future])
+            except Exception as e:
+                report['failed'].append((futures[future], e))
+    return report
+
+# Summary of an export for the message box
+def export_summary(report, dest_folder):
+    summary = f"Copied {len(report['copied'])}, already up to date {len(report['skipped'])}, failed {len(report['failed'])} - {dest_folder}"
+    failures = [f"{display_name(src_path)}: {error}" for src_path, error in report['failed'][:20]]
+    return '\n\n'.join([summary] + (['\n'.join(failures)] if failures else []))
+
 # Use if you want upload button to download to local directories
 def upload_files_to_directory():
     global current_directory
-    if not file_list_frame.winfo_children():
+    # Red files are never exported
+    file_paths = [file_path for file_path, color in file_entries.items() if color in ('green', 'orange')]
+    if not file_paths:
         messagebox.showwarning("No Files", "No files to upload.")
         return
 
@@ -453,38 +2577,31 @@ def upload_files_to_directory():
         messagebox.showwarning("No Destination", "No destination folder selected.")
         return
     
-    # Copy files to the destination folder
-    for child in file_list_frame.winfo_children():
-        for widget in child.winfo_children():
-            if isinstance(widget, tk.Label):
-                file_name = os.path.basename(widget.cget("text"))
-                file_color = widget.cget("fg")
-                
-                src_path = widget.path
-                dest_path = os.path.join(dest_folder, file_name)
-                
-                if os.path.exists(src_path):
-                    try:
-                        shutil.copy(src_path, dest_path)
-                    except Exception as e:
-                        print(f"Error copying file '{file_name}': {e}")
-    
-    messagebox.showinfo("Upload Complete", f"Files have been uploaded to {dest_folder}.")
+    # Copy files to the destination folder in the background, the summary shows when it's done
+    def export_in_background():
+        report = export_files(file_paths, dest_folder)
+        post_to_ui(finish_export, report, dest_folder)
+    threading.Thread(target=export_in_background, name="export", daemon=True).start()
+
+# Show how the export went
+def finish_export(report, dest_folder):
+    for src_path, error in report['failed']:
+        print(f"Error copying file '{display_name(src_path)}': {error}")
+    if report['failed']:
+        messagebox.showerror("Upload Finished With Errors", export_summary(report, dest_folder))
+    else:
+        messagebox.showinfo("Upload Complete", export_summary(report, dest_folder))
 
 # Checks to see if upload button should be available or not
 def update_upload_button_state():
-    # Check if there are any child frames in file_list_frame
-    has_files = any(isinstance(child, tk.Frame) for child in file_list_frame.winfo_children())
+    # Counts are kept up to date by set_entry_color, so this doesn't depend on the number of files
+    has_files = bool(file_entries)
     
-    # Check if there are any red files
-    has_red_files = any(
-        child.winfo_children()[0].cget("fg") == 'red'
-        for child in file_list_frame.winfo_children()
-        if isinstance(child, tk.Frame)
-    )
+    # Check if there are any red files, or files that are still being scanned
+    has_red_files = color_counts['red'] > 0 or color_counts[SCANNING_COLOR] > 0
     
-    # Update the state of the upload button
-    if has_files and not has_red_files:
+    # Update the state of the upload button, it stays off until the running uploads are done
+    if has_files and not has_red_files and not uploads_pending:
         upload_button.config(state=tk.NORMAL)
     else:
         upload_button.config(state=tk.DISABLED)
@@ -492,11 +2609,363 @@ def update_upload_button_state():
 # Exit the app
 def close_app():
     if messagebox.askokcancel("Quit", "Do you really wish to quit?"):
+        for executor in (scan_executor, upload_executor, pdf_executor):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        if profile_dir:
+            save_profile(profile_dir)
+            print(f"Profile written to {profile_dir}")
         root.destroy()
 
+# Collect the files to scan in batch mode, directories are expanded and filtered by pattern. Archives are kept whole, their members are read by the worker
+def collect_scan_paths(paths, recursive, pattern):
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        if recursive:
+            for dir_path, dir_names, file_names in os.walk(path):
+                dir_names.sort()
+                for file_name in sorted(file_names):
+                    if fnmatch.fnmatch(file_name, pattern) or file_name.lower().endswith(ARCHIVE_EXTENSIONS):
+                        yield os.path.join(dir_path, file_name)
+        else:
+            for file_name in sorted(os.listdir(path)):
+                file_path = os.path.join(path, file_name)
+                if (fnmatch.fnmatch(file_name, pattern) or file_name.lower().endswith(ARCHIVE_EXTENSIONS)) and os.path.isfile(file_path):
+                    yield file_path
+
+# Set up a batch worker process with the state data and the state being released
+def init_scan_worker(state, section_limit=None, index_path=None, rules_file=RULES_FILE):
+    global state_data, selected_state, PDF_PAGE_WORKERS, scan_index_path, rules_path, rule_profile
+    scan_index_path = index_path
+    rules_path, rule_profile = rules_file, None
+    # Files are already spread over the batch processes, PDF pages are extracted in the worker itself
+    PDF_PAGE_WORKERS = 0
+    state_data = load_states()
+    selected_state = state
+    if section_limit is not None:
+        SECTION_LIMITS[state] = section_limit
+
+# Scan one file in a batch worker and return a plain record of the verdict, data is the content of an archive member already read.
+# With cached the result comes from the in-memory cache, which holds results good for any state
+def scan_for_report(file_path, data, state, cached=False):
+    try:
+        result = cached_scan_file(file_path, data) if cached else indexed_scan(file_path, data, section_limit_for(state))
+    except (OSError, KeyError, PdfError, *archive_errors()) as e:
+        result = ScanResult([], (0,), None, None, 0, None, error=e)
+    except Exception as e:
+        # Anything else is a bug in the scanner or the rules. The file gets a red record so the rest of the batch still runs
+        sys.stderr.write(f"Error scanning file '{file_path}': {e!r}\n")
+        result = ScanResult([], (0,), None, None, 0, None, error=e)
+    return report_record(file_path, result, state)
+
+# Records for one batch path, a single file or every release note in an archive. Each archive is read once by one worker
+def scan_batch_item(path, pattern, state, cached=False):
+    if not is_archive(path):
+        return [scan_for_report(path, None, state, cached)]
+    try:
+        return [scan_for_report(archive_member_path(path, member), data, state, cached) for member, data in iter_archive_members(path, pattern)]
+    except (OSError, *archive_errors()) as e:
+        return [report_record(path, ScanResult([], (0,), None, None, 0, None, error=e), state)]
+
+# Plain record of the verdict for a file
+def report_record(file_path, result, state):
+    with timed_stage(file_path, 'verdict'):
+        color, messages = check_file(os.path.basename(file_path), result, state)
+    version, date, _ = state_header(result, state)
+    return {
+        'path': file_path,
+        'verdict': color,
+        'version': version,
+        'date': date,
+        'lines': result.line_count,
+        'reasons': messages + state_findings(result, state),
+    }
+
+# Headless batch mode: python script.py scan --state Illinois --recursive DIR
+def run_scan_cli(argv):
+    global instrumentation_enabled, profile_dir
+    import csv
+    from concurrent.futures import ProcessPoolExecutor
+    parser = argparse.ArgumentParser(prog="script.py scan", description="Check release notes without the GUI. Exits with 1 if any file is red.")
+    parser.add_argument('paths', nargs='+', help="files or directories to scan")
+    parser.add_argument('--state', required=True, help="state the release is for, e.g. Illinois")
+    parser.add_argument('--recursive', '-r', action='store_true', help="scan directories recursively")
+    parser.add_argument('--pattern', default='*.txt', help="file name pattern used inside directories and archives (default: *.txt)")
+    parser.add_argument('--format', choices=['json', 'csv'], default='json', help="one JSON object per line, or CSV rows")
+    parser.add_argument('--sections', type=int, help="number of release note sections to scan, 0 for the whole file (default: per state setting)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="number of scanning processes")
+    parser.add_argument('--index', default=scan_index_path, metavar='FILE', help=f"SQLite index of earlier scan results, may be shared (default: {scan_index_path})")
+    parser.add_argument('--no-index', action='store_true', help="don't read or write the scan index")
+    parser.add_argument('--profile', metavar='DIR', help="scan in this process with cProfile and stage timings, and write profile.prof, profile.txt and trace.json to DIR")
+    parser.add_argument('--rules', metavar='FILE', help=f"JSON rule profile with per state overrides (default: {rules_path} if it exists)")
+    args = parser.parse_args(argv)
+
+    state_names = [name for _, name in load_states()]
+    if args.state not in state_names:
+        parser.error(f"unknown state '{args.state}'")
+    # Checked here so a broken profile is reported once instead of by every worker
+    rules_file = args.rules or rules_path
+    try:
+        load_rules(rules_file, required=bool(args.rules))
+    except RuleError as e:
+        parser.error(str(e))
+
+    if args.format == 'csv':
+        writer = csv.writer(sys.stdout)
+        writer.writerow(['path', 'verdict', 'version', 'date', 'lines', 'reasons'])
+        write_record = lambda record: writer.writerow([record['path'], record['verdict'], record['version'], record['date'], record['lines'], '; '.join(record['reasons'])])
+    else:
+        write_record = lambda record: sys.stdout.write(json.dumps(record) + '\n')
+
+    file_paths = collect_scan_paths(args.paths, args.recursive, args.pattern)
+    index_path = None if args.no_index else args.index
+    has_red_files = False
+    with contextlib.ExitStack() as stack:
+        if args.profile:
+            # cProfile and the stage timings only see this process, so profiling scans here instead of in worker processes
+            instrumentation_enabled, profile_dir = True, args.profile
+            init_scan_worker(args.state, args.sections, index_path, rules_file)
+            start_profiling()
+            results = map(scan_batch_item, file_paths, itertools.repeat(args.pattern), itertools.repeat(args.state))
+        else:
+            executor = stack.enter_context(ProcessPoolExecutor(max_workers=max(1, args.workers), initializer=init_scan_worker, initargs=(args.state, args.sections, index_path, rules_file)))
+            # Results stream out in input order as soon as each chunk is done
+            results = executor.map(scan_batch_item, file_paths, itertools.repeat(args.pattern), itertools.repeat(args.state), chunksize=16)
+        for records in results:
+            for record in records:
+                write_record(record)
+                has_red_files = has_red_files or record['verdict'] == 'red'
+            sys.stdout.flush()
+
+    if args.profile:
+        save_profile(args.profile)
+        sys.stderr.write(stats_report() + f"\n\nProfile written to {args.profile}\n")
+
+    return 1 if has_red_files else 0
+
+# Time and size of the files the states are loaded from, to notice when they change
+def state_files_signature():
+    return tuple(stat_signature(path) for path in (STATE_ABBREVIATION_FILE, STATE_NAME_FILE, STATE_TABLE_FILE, rules_path))
+
+# Reload the states and the rule profile if their files changed since the daemon loaded them. Requests already running finish
+# against the old states first, since their results are bitmasks in state order, and new requests wait for the reload.
+# A rule profile with a mistake in it is reported and the old rules are kept
+def reload_states(force=False):
+    global state_data, served_state_files, scan_cache_bytes, rule_profile
+    with serve_reload_lock:
+        signature = state_files_signature()
+        if signature == served_state_files and not force:
+            return False
+        served_state_files = signature
+        try:
+            profile = load_rules(rules_path)
+        except RuleError as e:
+            serve_counters['reload_errors'] += 1
+            sys.stderr.write(f"Keeping the current rules: {e}\n")
+            return False
+        for _ in range(serve_max_requests):
+            serve_slots.acquire()
+        try:
+            state_data = load_states()
+            rule_profile = profile
+            all_states_matcher()
+            # Cached results were scanned against the old list of states
+            with scan_cache_lock:
+                scan_cache.clear()
+                scan_cache_keys.clear()
+                scan_cache_bytes = 0
+            serve_counters['reloads'] += 1
+        finally:
+            for _ in range(serve_max_requests):
+                serve_slots.release()
+    return True
+
+# Records for a daemon request in input order. A few paths are scanned ahead on the scan threads while earlier records are sent
+def serve_records(paths, state, recursive, pattern):
+    executor = get_scan_executor()
+    pending = deque()
+    try:
+        for path in collect_scan_paths(paths, recursive, pattern):
+            pending.append(executor.submit(scan_batch_item, path, pattern, state, True))
+            if len(pending) >= SERVE_READ_AHEAD:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        # The client went away, don't scan what it won't read
+        for future in pending:
+            future.cancel()
+
+# Counters for GET /status
+def serve_status():
+    return dict(serve_counters, states=len(state_data), workers=SCAN_WORKERS, max_requests=serve_max_requests, cache=scan_cache_info())
+
+# Daemon mode: python script.py serve. Takes POST /scan with {"state": "Illinois", "paths": [...]} and streams one JSON
+# record per line, the same records as batch mode, then a summary line. Only listens on localhost unless told otherwise
+def run_serve(argv):
+    global serve_slots, serve_max_requests, scan_index_path, rules_path
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    parser = argparse.ArgumentParser(prog="script.py serve", description="Keep the scanner running and answer scan requests over HTTP.")
+    parser.add_argument('--host', default=SERVE_HOST, help=f"address to listen on, requests have to name it or localhost as their Host (default: {SERVE_HOST})")
+    parser.add_argument('--port', type=int, default=SERVE_PORT, help=f"port to listen on (default: {SERVE_PORT})")
+    parser.add_argument('--max-requests', type=int, default=SERVE_MAX_REQUESTS, help=f"requests scanned at the same time, others wait (default: {SERVE_MAX_REQUESTS})")
+    parser.add_argument('--index', default=scan_index_path, metavar='FILE', help=f"SQLite index of earlier scan results, may be shared (default: {scan_index_path})")
+    parser.add_argument('--no-index', action='store_true', help="don't read or write the scan index")
+    parser.add_argument('--rules', metavar='FILE', help=f"JSON rule profile with per state overrides, reloaded when it changes (default: {rules_path} if it exists)")
+    args = parser.parse_args(argv)
+    scan_index_path = None if args.no_index else args.index
+    try:
+        load_rules(args.rules or rules_path, required=bool(args.rules))
+    except RuleError as e:
+        parser.error(str(e))
+    rules_path = args.rules or rules_path
+    serve_max_requests = max(1, args.max_requests)
+    serve_slots = threading.BoundedSemaphore(serve_max_requests)
+    # Warm up once so the first request doesn't pay for it
+    reload_states(force=True)
+    # A web page can point a name it owns at 127.0.0.1 and have the browser send requests here, they still carry that name as their Host
+    allowed_hosts = {'localhost', '127.0.0.1', '::1'} | ({args.host.lower()} if args.host not in ('', '0.0.0.0', '::') else set())
+
+    class ScanRequestHandler(BaseHTTPRequestHandler):
+        def host_allowed(self):
+            import urllib.parse
+            try:
+                host = urllib.parse.urlsplit('//' + self.headers.get('Host', '')).hostname
+            except ValueError:
+                host = None
+            if host in allowed_hosts:
+                return True
+            self.send_json(403, {'error': f"requests have to be sent to {' or '.join(sorted(allowed_hosts))}"})
+            return False
+
+        def send_json(self, status, body):
+            data = json.dumps(body).encode('utf8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if not self.host_allowed():
+                return
+            if self.path == '/status':
+                self.send_json(200, serve_status())
+            else:
+                self.send_json(404, {'error': f"unknown path {self.path}"})
+
+        def do_POST(self):
+            if not self.host_allowed():
+                return
+            if self.path == '/reload':
+                self.send_json(200, {'reloaded': reload_states(force=True), 'states': len(state_data)})
+                return
+            if self.path != '/scan':
+                self.send_json(404, {'error': f"unknown path {self.path}"})
+                return
+            # Browsers can only send other sites a JSON body after asking first, so plain form posts are turned away
+            if self.headers.get_content_type() != 'application/json':
+                self.send_json(415, {'error': "the request body has to be sent as application/json"})
+                return
+            # Everything is checked before the 200 goes out, once records are streaming an error can't be reported
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+                if not isinstance(request, dict):
+                    raise ValueError("the request must be a JSON object")
+                state = request['state']
+                paths = request['paths']
+                recursive = request.get('recursive', False)
+                pattern = request.get('pattern', '*.txt')
+                cwd = request.get('cwd')
+                if not isinstance(state, str):
+                    raise ValueError("state must be a string")
+                if not isinstance(paths, list) or not all(isinstance(path, str) for path in paths):
+                    raise ValueError("paths must be a list of strings")
+                if not isinstance(recursive, bool):
+                    raise ValueError("recursive must be true or false")
+                if not isinstance(pattern, str):
+                    raise ValueError("pattern must be a string")
+                if cwd is not None and not isinstance(cwd, str):
+                    raise ValueError("cwd must be a string")
+            except (ValueError, KeyError, TypeError) as e:
+                self.send_json(400, {'error': f"bad request: {e}"})
+                return
+
+            reload_states()
+            if state not in (name for _, name in state_data):
+                self.send_json(400, {'error': f"unknown state '{state}'"})
+                return
+            # Relative paths are taken from the client's working directory when it sends one
+            paths = [os.path.join(cwd, path) if cwd else path for path in paths]
+
+            if not serve_slots.acquire(timeout=SERVE_QUEUE_TIMEOUT):
+                self.send_json(503, {'error': "too many scans running, try again"})
+                return
+            try:
+                started = time.perf_counter()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.end_headers()
+                files = red_files = 0
+                for record in serve_records(paths, state, recursive, pattern):
+                    self.wfile.write(json.dumps(record).encode('utf8') + b'\n')
+                    self.wfile.flush()
+                    files += 1
+                    red_files += record['verdict'] == 'red'
+                summary = {'files': files, 'red': red_files, 'elapsed_ms': round((time.perf_counter() - started) * 1000, 3)}
+                self.wfile.write(json.dumps({'summary': summary}).encode('utf8') + b'\n')
+                serve_counters['requests'] += 1
+                serve_counters['files'] += files
+            except (BrokenPipeError, ConnectionResetError):
+                serve_counters['disconnects'] += 1
+            finally:
+                serve_slots.release()
+
+    server = ThreadingHTTPServer((args.host, args.port), ScanRequestHandler)
+    server.daemon_threads = True
+    sys.stderr.write(f"Serving scans on http://{args.host}:{server.server_port}/scan\n")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
 if __name__ == "__main__":
+    # Batch mode never imports tkinter
+    if len(sys.argv) > 1 and sys.argv[1] == 'scan':
+        sys.exit(run_scan_cli(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        sys.exit(run_serve(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == 'build-state-table':
+        sys.exit(build_state_table())
+
+    parser = argparse.ArgumentParser(description="Check release notes for a state before uploading them. Run 'script.py scan --help' for batch mode, 'script.py serve --help' for the scan daemon.")
+    parser.add_argument('--stats', action='store_true', help="time each scan and UI stage, shown with the Stats button")
+    parser.add_argument('--index', default=scan_index_path, metavar='FILE', help=f"SQLite index of earlier scan results, may be shared (default: {scan_index_path})")
+    parser.add_argument('--no-index', action='store_true', help="don't read or write the scan index")
+    parser.add_argument('--profile', metavar='DIR', help="also run cProfile, and write profile.prof, profile.txt and trace.json to DIR on exit")
+    parser.add_argument('--rules', metavar='FILE', help=f"JSON rule profile with per state overrides (default: {rules_path} if it exists)")
+    args = parser.parse_args()
+    instrumentation_enabled = args.stats or bool(args.profile)
+    profile_dir = args.profile
+    scan_index_path = None if args.no_index else args.index
+    try:
+        rule_profile = load_rules(args.rules or rules_path, required=bool(args.rules))
+    except RuleError as e:
+        parser.error(str(e))
+    if profile_dir:
+        start_profiling()
+
+    import tkinter as tk
+    from tkinter import ttk, filedialog, messagebox
+    from tkinterdnd2 import DND_FILES, TkinterDnD
+
     # Load state data
-    state_data = load_state_data("us-states-abbreviation.txt", "us-states.txt")
+    state_data = load_states()
     selected_state = None
     current_directory = ""
 
@@ -527,9 +2996,31 @@ if __name__ == "__main__":
     root.drop_target_register(DND_FILES)
     root.dnd_bind('<<Drop>>', on_drop)
 
-    # Listbox to display file names
+    # List of files, one Treeview row per file so thousands of files stay responsive
     file_list_frame = tk.Frame(root)
-    file_list_frame.pack(pady=10)
+    file_list_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+    file_tree = ttk.Treeview(file_list_frame, columns=('status', 'group'), selectmode='extended', height=15)
+    file_tree.heading('#0', text="File")
+    file_tree.heading('status', text="Status")
+    file_tree.column('status', width=110, stretch=False)
+    file_tree.heading('group', text="Same content")
+    file_tree.column('group', width=110, stretch=False)
+    for color in STATUS_TEXT:
+        file_tree.tag_configure(color, foreground=color)
+    file_scrollbar = ttk.Scrollbar(file_list_frame, orient=tk.VERTICAL, command=file_tree.yview)
+    file_tree.configure(yscrollcommand=file_scrollbar.set)
+    file_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+    file_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+    file_tree.bind("<Double-1>", show_file_output)
+    file_tree.bind("<Delete>", lambda event: remove_file_entry())
+
+    # Buttons for the selected files
+    entry_button_frame = tk.Frame(root)
+    entry_button_frame.pack()
+    ignore_button = tk.Button(entry_button_frame, text="Ignore", command=ignore_file_entry)
+    ignore_button.pack(side=tk.LEFT, padx=10)
+    remove_entry_button = tk.Button(entry_button_frame, text="Remove", command=remove_file_entry)
+    remove_entry_button.pack(side=tk.LEFT, padx=10)
     
     # Frame to hold the buttons at the bottom
     bottom_frame = tk.Frame(root)
@@ -544,6 +3035,16 @@ if __name__ == "__main__":
     # Create the upload button
     upload_button = tk.Button(button_frame, text="Upload to Artifactory", command=upload_files)
     upload_button.pack(side=tk.LEFT, padx=10)
+
+    # Timings panel, only when started with --stats or --profile
+    if instrumentation_enabled:
+        stats_button = tk.Button(button_frame, text="Stats", command=show_stats)
+        stats_button.pack(side=tk.LEFT, padx=10)
+
+    # Scan cache counters
+    cache_label = tk.Label(bottom_frame, fg='gray')
+    cache_label.pack(pady=(10, 0))
+    update_cache_status()
     
     # Initialize upload button state
     update_upload_button_state()
@@ -551,5 +3052,11 @@ if __name__ == "__main__":
     # Set up application close confirmation
     root.protocol("WM_DELETE_WINDOW", close_app)
 
+    # Pick up results from the scanning threads
+    root.after(UI_POLL_MS, poll_ui_queue)
+
+    # Rescan listed files when they change on disk
+    start_file_watcher()
+
     # Run the GUI loop
     root.mainloop()
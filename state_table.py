@@ -0,0 +1,59 @@
+### Generated by "python script.py build-state-table" from us-states-abbreviation.txt and us-states.txt, don't edit by hand.
+### The text files are used instead whenever one of them is newer than this file
+
+STATES = (
+    ('AK', 'Alaska'),
+    ('AL', 'Alabama'),
+    ('AZ', 'Arizona'),
+    ('AR', 'Arkansas'),
+    ('CA', 'California'),
+    ('CO', 'Colorado'),
+    ('CT', 'Connecticut'),
+    ('DE', 'Delaware'),
+    ('FL', 'Florida'),
+    ('GA', 'Georgia'),
+    ('HI', 'Hawaii'),
+    ('ID', 'Idaho'),
+    ('IL', 'Illinois'),
+    ('IN', 'Indiana'),
+    ('IA', 'Iowa'),
+    ('KS', 'Kansas'),
+    ('KY', 'Kentucky'),
+    ('LA', 'Louisiana'),
+    ('ME', 'Maine'),
+    ('MD', 'Maryland'),
+    ('MA', 'Massachusetts'),
+    ('MI', 'Michigan'),
+    ('MN', 'Minnesota'),
+    ('MS', 'Mississippi'),
+    ('MO', 'Missouri'),
+    ('MT', 'Montana'),
+    ('NE', 'Nebraska'),
+    ('NV', 'Nevada'),
+    ('NH', 'New Hampshire'),
+    ('NJ', 'New Jersey'),
+    ('NM', 'New Mexico'),
+    ('NY', 'New York'),
+    ('NC', 'North Carolina'),
+    ('ND', 'North Dakota'),
+    ('OH', 'Ohio'),
+    ('OK', 'Oklahoma'),
+    ('OR', 'Oregon'),
+    ('PA', 'Pennsylvania'),
+    ('RI', 'Rhode Island'),
+    ('SC', 'South Carolina'),
+    ('SD', 'South Dakota'),
+    ('TN', 'Tennessee'),
+    ('TX', 'Texas'),
+    ('UT', 'Utah'),
+    ('VT', 'Vermont'),
+    ('VA', 'Virginia'),
+    ('WA', 'Washington'),
+    ('WV', 'West Virginia'),
+    ('WI', 'Wisconsin'),
+    ('WY', 'Wyoming'),
+)
+
+# Trie alternations for build_state_matcher
+ABBREVIATION_PATTERN = '(?:(?:A(?:K|L|R|Z)|C(?:A|O|T)|DE|FL|GA|HI|I(?:A|D|L|N)|K(?:S|Y)|LA|M(?:A|D|E|I|N|O|S|T)|N(?:C|D|E|H|J|M|V|Y)|O(?:H|K|R)|PA|RI|S(?:C|D)|T(?:N|X)|UT|V(?:A|T)|W(?:A|I|V|Y)))'
+NAME_PATTERN = '(?:(?:A(?:la(?:bama|ska)|r(?:izona|kansas))|C(?:alifornia|o(?:lorado|nnecticut))|Delaware|Florida|Georgia|Hawaii|I(?:daho|llinois|ndiana|owa)|K(?:ansas|entucky)|Louisiana|M(?:a(?:ine|ryland|ssachusetts)|i(?:chigan|nnesota|ss(?:issippi|ouri))|ontana)|N(?:e(?:braska|vada|w\\ (?:Hampshire|Jersey|Mexico|York))|orth\\ (?:Carolina|Dakota))|O(?:hio|klahoma|regon)|Pennsylvania|Rhode\\ Island|South\\ (?:Carolina|Dakota)|Te(?:nnessee|xas)|Utah|V(?:ermont|irginia)|W(?:ashington|est\\ Virginia|isconsin|yoming)))'
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# script.py isn't a package, so the tests import it from the repo folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import script
+
+
+# The states from the repo's state files, as the CLI and GUI load them at startup
+@pytest.fixture(autouse=True)
+def states(monkeypatch):
+    monkeypatch.setattr(script, 'state_data', script.load_states(), raising=False)
+    return script.state_data
+
+
+# Write a release note into the test's temporary folder and return its path
+@pytest.fixture
+def write_notes(tmp_path):
+    def write(text, name='notes_1.2.3.4.txt'):
+        path = tmp_path / name
+        path.write_text(text, encoding='utf8')
+        return str(path)
+    return write
@@ -0,0 +1,130 @@
+import collections
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+
+import script
+
+NOTES = f"Version: 1.2.3.4 {datetime.now().strftime('%m/%d/%Y')}\nFixed a bug\n"
+
+
+# Stand-in for the file list, keeps the values the GUI would show
+class FileTree:
+    def __init__(self):
+        self.rows = {}
+
+    def insert(self, parent, index, iid, text):
+        self.rows[iid] = {'text': text}
+
+    def item(self, iid, **options):
+        self.rows[iid].update(options)
+
+    def set(self, iid, column, value):
+        self.rows[iid][column] = value
+
+    def delete(self, *iids):
+        for iid in iids:
+            del self.rows[iid]
+
+
+class Widget:
+    def config(self, **options):
+        pass
+
+
+# The GUI's module state, empty, with widget stand-ins and scans counted. Each scan waits for the gate to be set, there are
+# enough workers for the other copies to be hashed meanwhile
+@pytest.fixture
+def gui(monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=4)
+    monkeypatch.setattr(script, 'scan_executor', executor)
+    for name, value in [('file_entries', {}), ('file_results', {}), ('content_groups', {}), ('entry_digests', {}), ('content_scans', {}),
+                        ('content_group_numbers', {}), ('color_counts', collections.Counter()), ('pending_scans', set()),
+                        ('watched_files', {}), ('polled_files', {}), ('scan_index_path', None), ('selected_state', 'Illinois'),
+                        ('file_tree', FileTree()), ('upload_button', Widget()), ('cache_label', Widget())]:
+        monkeypatch.setattr(script, name, value, raising=False)
+    monkeypatch.setattr(script, 'tk', types.SimpleNamespace(END='end', NORMAL='normal', DISABLED='disabled'), raising=False)
+    gui = types.SimpleNamespace(scans=[], gate=threading.Event(), scanning=threading.Event())
+    gui.gate.set()
+    cached_scan_file = script.cached_scan_file
+
+    def counted_scan(file_path, data=None, content_digest=None):
+        gui.scans.append(file_path)
+        gui.scanning.set()
+        gui.gate.wait(10)
+        return cached_scan_file(file_path, data, content_digest)
+
+    monkeypatch.setattr(script, 'cached_scan_file', counted_scan)
+    yield gui
+    gui.gate.set()
+    executor.shutdown()
+
+
+# Run the background work and the UI calls it posts until nothing is left
+def settle():
+    while True:
+        for future in list(script.pending_scans):
+            future.result(10)
+        if script.ui_queue.empty():
+            return
+        while not script.ui_queue.empty():
+            func, args = script.ui_queue.get()
+            func(*args)
+
+
+@pytest.fixture
+def copies(tmp_path):
+    paths = []
+    for folder, name in [('a', 'notes_1.2.3.4.txt'), ('b', 'notes_1.2.3.4.txt'), ('c', 'notes_9.9.9.9.txt')]:
+        (tmp_path / folder).mkdir()
+        path = tmp_path / folder / name
+        path.write_text(NOTES, encoding='utf8')
+        paths.append(str(path))
+    return paths
+
+
+# Copies of the same content are scanned once, each one is still checked against its own file name
+def test_copies_scanned_once(gui, copies):
+    script.add_files(copies)
+    settle()
+    assert len(gui.scans) == 1
+    assert [script.file_entries[path] for path in copies] == ['green', 'green', 'red']
+    assert len(script.content_groups) == 1
+    assert {script.file_tree.rows[path]['group'] for path in copies} == {'#1 (3 copies)'}
+
+
+# An unchanged file added again takes the result its copies have, without another scan
+def test_readding_unchanged_file(gui, copies):
+    script.add_files(copies)
+    settle()
+    script.add_files(copies[:1])
+    settle()
+    assert len(gui.scans) == 1
+    assert [script.file_entries[path] for path in copies] == ['green', 'green', 'red']
+    assert [sorted(members) for members in script.content_groups.values()] == [sorted(copies)]
+
+
+# The copy being scanned is removed before its scan is done, the result still goes to the copies that are left
+def test_removing_copy_while_it_is_scanned(gui, copies):
+    gui.gate.clear()
+    script.add_files(copies)
+    assert gui.scanning.wait(10)
+    # Let the other copies join the group while the scan waits
+    deadline = time.monotonic() + 10
+    while sum(map(len, script.content_groups.values())) < len(copies):
+        assert time.monotonic() < deadline
+        func, args = script.ui_queue.get(timeout=10)
+        func(*args)
+    scanned = gui.scans[0]
+    script.remove_entry(scanned)
+    gui.gate.set()
+    settle()
+    left = [path for path in copies if path != scanned]
+    assert len(gui.scans) == 1
+    assert scanned not in script.file_entries and scanned not in script.file_results
+    assert [script.file_entries[path] for path in left] == [color for path, color in zip(copies, ['green', 'green', 'red']) if path != scanned]
+    assert [sorted(members) for members in script.content_groups.values()] == [sorted(left)]
@@ -0,0 +1,30 @@
+import pytest
+
+import script
+
+HIT_LINES = [3, 10, 1500, 1999]
+
+
+# 2000 lines of about 80 bytes, so the lines from 10 to 1500 are well over CONTEXT_READ_BEHIND and the line by line scan
+# indexes several blocks. A few lines mention Texas
+@pytest.fixture
+def long_notes(write_notes):
+    lines = ['Version: 1.2.3.4 01/02/2024'] + [f"{number:>5} {'Texas' if number in HIT_LINES else 'fixed'} " + 'x' * 68 for number in range(2, 2001)]
+    assert sum(len(line) + 1 for line in lines[9:1499]) > script.CONTEXT_READ_BEHIND
+    return write_notes('\n'.join(lines) + '\n'), lines
+
+
+# The same lines come back whichever index the read starts from: the block index of the line by line scan, the hit lines
+# the memory-mapped scan indexes, or none
+@pytest.mark.parametrize('index', ['scan_file', 'scan_file_mmap', None])
+@pytest.mark.parametrize('line_number', [1, 3, 10, 11, 800, 1500, 1505, 2000])
+def test_line_context(long_notes, index, line_number):
+    path, lines = long_notes
+    line_index = getattr(script, index)(path, script.all_states_matcher(), 0).line_index if index else None
+    first = max(1, line_number - script.FINDING_CONTEXT_LINES)
+    assert script.line_context(path, line_index, line_number) == (first, lines[first - 1:line_number + script.FINDING_CONTEXT_LINES])
+
+
+def test_mmap_index_only_has_hit_lines(long_notes):
+    path, _ = long_notes
+    assert script.scan_file_mmap(path, script.all_states_matcher(), 0).line_index.line_numbers == [1] + HIT_LINES
@@ -0,0 +1,44 @@
+import errno
+import os
+
+import pytest
+
+import script
+
+
+# When copy_file_range stops partway, sendfile carries on writing where it stopped instead of at the start of the file
+@pytest.mark.skipif(not hasattr(os, 'copy_file_range') or not hasattr(os, 'sendfile'), reason="needs copy_file_range and sendfile")
+def test_sendfile_continues_where_copy_file_range_stopped(tmp_path, monkeypatch):
+    data = os.urandom(300000)
+    src, dest = tmp_path / 'src.txt', tmp_path / 'dest.txt'
+    src.write_bytes(data)
+    copy_file_range = os.copy_file_range
+    calls = []
+
+    def copy_then_fail(src_fd, dest_fd, count, offset_src, offset_dst):
+        if calls:
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        calls.append(count)
+        return copy_file_range(src_fd, dest_fd, min(count, 100000), offset_src, offset_dst)
+
+    monkeypatch.setattr(os, 'copy_file_range', copy_then_fail)
+    with open(src, 'rb') as src_file, open(dest, 'wb') as dest_file:
+        script.copy_file_contents(src_file, dest_file, len(data))
+    assert dest.read_bytes() == data
+
+
+# A release note written out of an archive gets the mode a new file would, not the private mode of a temporary file
+@pytest.mark.skipif(os.name != 'posix', reason="needs POSIX file modes")
+def test_archive_member_export_follows_umask(tmp_path):
+    import zipfile
+    archive = tmp_path / 'bundle.zip'
+    with zipfile.ZipFile(archive, 'w') as bundle:
+        bundle.writestr('docs/notes_1.2.3.4.txt', 'Version: 1.2.3.4 01/02/2024\n')
+    dest = tmp_path / 'notes_1.2.3.4.txt'
+    umask = os.umask(0o027)
+    try:
+        assert script.export_archive_member(str(archive), 'docs/notes_1.2.3.4.txt', str(dest)) == 'copied'
+    finally:
+        os.umask(umask)
+    assert dest.stat().st_mode & 0o777 == 0o640
+    assert sorted(os.listdir(tmp_path)) == ['bundle.zip', 'notes_1.2.3.4.txt']
@@ -0,0 +1,117 @@
+import json
+import random
+import re
+
+import pytest
+
+import script
+
+# Characters put around state mentions: ASCII and Unicode spaces, which count as word boundaries, and characters that don't
+SEPARATORS = [' ', '\t', '_', '\xa0', ' ', '　', ' ', '\x1c', '\x85', ',', '.', '-', 'x', '\xe9', '']
+WORDS = ['TX', 'Texas', 'texas', 'IL', 'Illinois', 'West Virginia', 'Virginia', 'NEW YORK', 'CA', 'tax', 'fixed', 'report']
+
+
+# A release note with random state mentions, skipped lines and section boundaries
+def random_notes(seed, lines=400):
+    rng = random.Random(seed)
+    out = ['Release notes', '=====', 'Version: 1.2.3.4 01/02/2024']
+    for _ in range(lines):
+        roll = rng.random()
+        if roll < 0.04:
+            out.append(rng.choice(['-----', '=====', '\xa0---- ', ' === ']))
+        elif roll < 0.08:
+            out.append(rng.choice(['', '  ', '\xa0']))
+        else:
+            words = [rng.choice(SEPARATORS).join(['', rng.choice(WORDS), '']) for _ in range(rng.randint(1, 5))]
+            line = rng.choice(SEPARATORS).join(words)
+            if roll < 0.12:
+                line = rng.choice(['CIVID-12 ', '- ', '  -']) + line
+            out.append(line)
+    return '\n'.join(out) + '\n'
+
+
+# find_states as it was before build_state_matcher: a separate search for every abbreviation, then every state name.
+# Returns the line number, the kind of hit and the token of each flagged line
+def per_state_find_states(filename, state_abbreviations, state_names):
+    output = []
+    with open(filename, 'r', encoding="utf8", errors='ignore') as file:
+        for line_number, line in enumerate(file, 1):
+            if "CIVID" in line or line.strip().startswith("-"):
+                continue
+            found = [('Abbreviation', abbreviation) for abbreviation in state_abbreviations
+                     if re.search(rf'(^|[\s_]){re.escape(abbreviation)}($|[\s_])', line)]
+            if not found:
+                found = [('State Name', name) for name in state_names
+                         if re.search(rf'(^|[\s_]){re.escape(name)}($|[\s_])', line, re.IGNORECASE)]
+            if found:
+                output.append((line_number, found[0][0], {token for _, token in found}))
+    return output
+
+
+# Same lines flagged and the same kind of hit as the per-state loop. With several hits on a line the old loop reported the first
+# in set order and find_states reports the leftmost, so the token only has to be one the old loop found too
+@pytest.mark.parametrize('seed', range(5))
+def test_find_states_matches_per_state_loop(write_notes, states, seed):
+    path = write_notes(random_notes(seed, lines=200))
+    for selected in random.Random(seed).sample(states, 10):
+        abbreviations = {abbreviation for abbreviation, name in states if name != selected[1]}
+        names = {name for abbreviation, name in states if name != selected[1]}
+        expected = per_state_find_states(path, sorted(abbreviations), sorted(names))
+        found = [re.fullmatch(r'Line (\d+): .* \(Found (Abbreviation|State Name): (.+)\)', line, re.DOTALL).groups()
+                 for line in script.find_states(path, abbreviations, names)]
+        assert [(int(line_number), kind) for line_number, kind, _ in found] == [(line_number, kind) for line_number, kind, _ in expected]
+        assert all(token in tokens for (_, _, token), (_, _, tokens) in zip(found, expected))
+
+
+# line_hits finds every state the per-state patterns find on a line, abbreviations and names apart
+@pytest.mark.parametrize('seed', range(5))
+def test_line_hits_matches_per_state_patterns(states, seed):
+    matcher = script.all_states_matcher()
+    for line in random_notes(seed).split('\n'):
+        abbreviations, names = script.line_hits(matcher, line)
+        assert {states[index][0] for index in abbreviations} == {abbreviation for abbreviation, _ in states
+                                                                 if re.search(rf'(^|[\s_]){re.escape(abbreviation)}($|[\s_])', line)}
+        assert {states[index][1] for index in names} == {name for _, name in states
+                                                         if re.search(rf'(^|[\s_]){re.escape(name)}($|[\s_])', line, re.IGNORECASE)}
+
+
+# The memory-mapped scanner is used for big files and has to find exactly what the line by line scan finds
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('section_limit', [0, 1, 3])
+def test_scan_file_mmap_matches_scan_file(write_notes, seed, section_limit):
+    path = write_notes(random_notes(seed))
+    matcher = script.all_states_matcher()
+    expected = script.scan_file(path, matcher, section_limit)
+    result = script.scan_file_mmap(path, matcher, section_limit)
+    assert result.hits == expected.hits
+    assert result.section_masks == expected.section_masks
+    assert (result.version, result.date, result.line_count) == (expected.version, expected.date, expected.line_count)
+    assert result.extra_section_masks == expected.extra_section_masks == ()
+
+
+# With states that have their own version headers, sections are counted from each header and the scan stops once all reached the limit
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('section_limit', [0, 1, 3])
+def test_scan_file_mmap_matches_scan_file_with_state_headers(tmp_path, write_notes, monkeypatch, seed, section_limit):
+    rules = tmp_path / 'rules.json'
+    rules.write_text(json.dumps({'states': {'Texas': {'version': 'Release\\s+([\\d.]+)'}, 'Ohio': {'version': 'Build\\s+(\\d+)'}}}), encoding='utf8')
+    monkeypatch.setattr(script, 'rule_profile', script.load_rules(str(rules), required=True))
+    lines = random_notes(seed).split('\n')
+    rng = random.Random(seed)
+    for header in ('Release 1.2.3.4', 'Build 7'):
+        lines.insert(rng.randrange(len(lines)), header)
+    path = write_notes('\n'.join(lines))
+    matcher = script.all_states_matcher()
+    expected = script.scan_file(path, matcher, section_limit)
+    result = script.scan_file_mmap(path, matcher, section_limit)
+    assert result.hits == expected.hits
+    assert (result.section_masks, result.extra_section_masks) == (expected.section_masks, expected.extra_section_masks)
+    assert (result.extra_headers, result.line_count) == (expected.extra_headers, expected.line_count)
+
+
+@pytest.mark.parametrize('line', ['foo\xa0TX\xa0bar', 'Texas x', '　Illinois', 'see\x1cCA', 'TX\xa0'])
+def test_unicode_spaces_are_boundaries_in_mmap_scan(write_notes, line):
+    path = write_notes(f'Version: 1.2.3.4 01/02/2024\n{line}\n')
+    matcher = script.all_states_matcher()
+    result = script.scan_file_mmap(path, matcher)
+    assert result.hits and result.hits == script.scan_file(path, matcher).hits
@@ -0,0 +1,58 @@
+import json
+import os
+import subprocess
+import sys
+
+import script
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'script.py')
+
+
+# Run the batch scan with the index turned off and return its exit code, stdout and stderr
+def run_scan(*args):
+    env = dict(os.environ, RELEASE_NOTES_INDEX='')
+    process = subprocess.run([sys.executable, SCRIPT, 'scan', *args], capture_output=True, text=True, env=env)
+    return process.returncode, process.stdout, process.stderr
+
+
+# A missing file gets a record saying it couldn't be read, and the diagnostic goes to stderr so stdout stays JSON
+def test_missing_file_is_reported_unreadable(tmp_path):
+    path = str(tmp_path / 'notes_1.2.3.4.txt')
+    code, out, err = run_scan(path, '--state', 'Illinois')
+    records = [json.loads(line) for line in out.splitlines()]
+    assert code == 1
+    assert [record['verdict'] for record in records] == ['red']
+    assert records[0]['reasons'][0].startswith('Could not read file')
+    assert 'was not found' in err
+
+
+def test_scan_file_returns_error_for_missing_file(tmp_path):
+    result = script.scan_file(str(tmp_path / 'missing.txt'), script.all_states_matcher())
+    assert isinstance(result.error, FileNotFoundError)
+
+
+# An index that can't be opened is reported on stderr and the scan goes on without it
+def test_unusable_index_keeps_stdout_clean(tmp_path, write_notes):
+    path = write_notes('Version: 1.2.3.4 01/02/2024\nFixed a bug\n')
+    code, out, err = run_scan(path, '--state', 'Illinois', '--index', str(tmp_path / 'missing' / 'index.sqlite'))
+    assert [json.loads(line)['path'] for line in out.splitlines()] == [path]
+    assert 'Could not open the scan index' in err
+
+
+def test_rules_with_optional_version_group(tmp_path, write_notes):
+    rules = tmp_path / 'rules.json'
+    rules.write_text(json.dumps({'version': 'version: (\\d+)|release'}), encoding='utf8')
+    path = write_notes('release notes\nversion: 5 01/02/2024\n', name='notes_5.txt')
+    code, out, err = run_scan(path, '--state', 'Illinois', '--rules', str(rules))
+    assert [json.loads(line)['version'] for line in out.splitlines()] == ['5']
+    assert 'Traceback' not in err
+
+
+# A bug while scanning a file gives that file a red record instead of ending the batch
+def test_unexpected_scan_error_is_a_red_record(write_notes, monkeypatch):
+    def broken_scan(*args):
+        raise AttributeError("'NoneType' object has no attribute 'strip'")
+    monkeypatch.setattr(script, 'indexed_scan', broken_scan)
+    record = script.scan_for_report(write_notes('Version: 1.2.3.4 01/02/2024\n'), None, 'Illinois')
+    assert record['verdict'] == 'red'
+    assert record['reasons'][0].startswith('Could not read file')
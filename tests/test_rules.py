@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+import script
+
+# The version group only takes part in one branch, so "release notes" matches without a version
+OPTIONAL_VERSION_RULES = {'version': 'version: (\\d+)|release'}
+
+
+@pytest.fixture
+def rules_file(tmp_path):
+    path = tmp_path / 'rules.json'
+    path.write_text(json.dumps(OPTIONAL_VERSION_RULES), encoding='utf8')
+    return str(path)
+
+
+# A line the version pattern matches without its version group isn't taken as the header
+def test_version_pattern_without_group_match(rules_file, write_notes, monkeypatch):
+    monkeypatch.setattr(script, 'rule_profile', script.load_rules(rules_file, required=True))
+    path = write_notes('release notes\nversion: 5 01/02/2024\nTexas\n')
+    for scan in (script.scan_file, script.scan_file_mmap):
+        result = scan(path, script.all_states_matcher(), 1)
+        assert (result.version, result.date) == ('5', '01/02/2024')
+        assert [hit.line_number for hit in result.hits] == [3]
+
+
+# A state with its own version header counts sections from that header, the main header's sections don't cut its scan off
+def test_sections_counted_from_state_header(tmp_path, write_notes, monkeypatch):
+    path = tmp_path / 'state_rules.json'
+    path.write_text(json.dumps({'sections': 1, 'states': {'New Jersey': {'version': 'Release\\s+([\\d.]+)', 'sections': 1}}}), encoding='utf8')
+    monkeypatch.setattr(script, 'rule_profile', script.load_rules(str(path), required=True))
+    notes = write_notes('Version: 1.2.3.4 01/02/2025\nFixed a bug\n-----\nRelease 1.2.3.4 2025-01-02\nNew Jersey fixes\n-----\n'
+                        'Release 1.2.3.3\nTexas report\n-----\nOhio report\n')
+    for limit in (1, 0):
+        results = [scan(notes, script.all_states_matcher(), limit) for scan in (script.scan_file, script.scan_file_mmap)]
+        for result in results:
+            assert result.extra_headers == (('1.2.3.4', None),)
+            assert script.other_states_mask(result, 'New Jersey') == 0
+            assert script.finding_hits(result, 'New Jersey') == []
+        assert results[0].hits == results[1].hits
+        assert results[0].section_masks == results[1].section_masks
+        assert results[0].extra_section_masks == results[1].extra_section_masks
+        assert [hit.line_number for hit in results[0].hits] == ([5] if limit else [5, 8, 10])
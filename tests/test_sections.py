@@ -0,0 +1,29 @@
+import os
+from datetime import datetime
+
+import script
+
+TODAY = datetime.now().strftime('%m/%d/%Y')
+
+
+# A line of dashes or equals straight under the version header underlines it, the section only ends at a later one
+def test_underline_under_version_header_does_not_end_section(write_notes):
+    path = write_notes(f"Version: 1.2.3.4 {TODAY}\n=======\nFixed TX tax rounding\nTexas report\n")
+    for scan in (script.scan_file, script.scan_file_mmap):
+        result = scan(path, script.all_states_matcher(), 1)
+        assert [hit.line_number for hit in result.hits] == [3, 4]
+        assert script.check_file(os.path.basename(path), result, 'Illinois')[0] == 'red'
+
+
+def test_blank_lines_under_header_before_underline(write_notes):
+    path = write_notes(f"Version: 1.2.3.4 {TODAY}\n\n  \n-----\nTexas report\n")
+    for scan in (script.scan_file, script.scan_file_mmap):
+        assert [hit.line_number for hit in scan(path, script.all_states_matcher(), 1).hits] == [5]
+
+
+def test_boundary_after_text_ends_section(write_notes):
+    path = write_notes(f"Version: 1.2.3.4 {TODAY}\n=======\nFixed a bug\n-------\nVersion: 1.2.3.3\nTexas report\n")
+    for scan in (script.scan_file, script.scan_file_mmap):
+        result = scan(path, script.all_states_matcher(), 1)
+        assert result.hits == []
+        assert script.check_file(os.path.basename(path), result, 'Illinois')[0] == 'green'
@@ -0,0 +1,62 @@
+import http.client
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'script.py')
+
+
+# The scan daemon on a free port, without the index
+@pytest.fixture(scope='module')
+def server():
+    process = subprocess.Popen([sys.executable, SCRIPT, 'serve', '--port', '0', '--no-index'], stderr=subprocess.PIPE, text=True)
+    line = process.stderr.readline()
+    assert line.startswith('Serving scans on'), line
+    yield int(line.rsplit(':', 1)[1].split('/')[0])
+    process.terminate()
+    process.wait()
+
+
+def post(port, body, host=None, content_type='application/json'):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    headers = {'Content-Type': content_type}
+    if host:
+        headers['Host'] = host
+    connection.request('POST', '/scan', json.dumps(body), headers)
+    response = connection.getresponse()
+    lines = [json.loads(line) for line in response.read().splitlines()]
+    connection.close()
+    return response.status, lines
+
+
+def test_scan(server, write_notes):
+    path = write_notes('Version: 1.2.3.4 01/02/2024\nTexas report\n')
+    status, lines = post(server, {'state': 'Illinois', 'paths': [path]})
+    assert status == 200
+    assert lines[0]['verdict'] == 'red'
+    assert lines[-1]['summary']['files'] == 1
+
+
+# Bad fields are answered with a 400 before any record is streamed
+@pytest.mark.parametrize('body', [
+    {'state': 'Illinois', 'paths': [1]},
+    {'state': 'Illinois', 'paths': 'notes.txt'},
+    {'state': 'Illinois', 'paths': [], 'pattern': ['*.txt']},
+    {'state': 'Illinois', 'paths': [], 'recursive': 'yes'},
+    {'state': ['Illinois'], 'paths': []},
+    ['Illinois'],
+])
+def test_bad_request(server, body):
+    status, lines = post(server, body)
+    assert status == 400
+    assert lines[0]['error'].startswith('bad request')
+
+
+# Requests sent through a name pointed at 127.0.0.1 by someone else's page, or posted as a plain form, are turned away
+def test_foreign_host_and_form_posts_are_refused(server):
+    assert post(server, {'state': 'Illinois', 'paths': []}, host='attacker.example:8767')[0] == 403
+    assert post(server, {'state': 'Illinois', 'paths': []}, host=f'localhost:{server}')[0] == 200
+    assert post(server, {'state': 'Illinois', 'paths': []}, content_type='text/plain')[0] == 415
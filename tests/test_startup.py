@@ -0,0 +1,16 @@
+import json
+import os
+import subprocess
+import sys
+
+# Modules importing script must not load, the features that need them import them on first use
+LAZY_MODULES = ['tkinter', 'tkinterdnd2', 'http.client', 'sqlite3', 'zipfile', 'tarfile', 'multiprocessing', 'concurrent.futures',
+                'cProfile', 'pstats', 'ctypes', 'tempfile', 'csv', 'fitz', 'pypdf']
+
+
+# Checked in a fresh interpreter, the tests themselves have loaded most of these by now
+def test_import_script_leaves_lazy_modules_unloaded():
+    code = f"import json, sys, script; print(json.dumps([module for module in {LAZY_MODULES!r} if module in sys.modules]))"
+    completed = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               capture_output=True, text=True, check=True)
+    assert json.loads(completed.stdout) == []
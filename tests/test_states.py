@@ -0,0 +1,27 @@
+import os
+
+import script
+
+
+# A rebuilt state table is read again instead of the module imported earlier, which is what a running daemon reloads
+def test_rebuilt_state_table_is_read_again(tmp_path, monkeypatch):
+    abbreviations, names, table = tmp_path / 'abbreviations.txt', tmp_path / 'names.txt', tmp_path / 'state_table.py'
+    monkeypatch.setattr(script, 'STATE_ABBREVIATION_FILE', str(abbreviations))
+    monkeypatch.setattr(script, 'STATE_NAME_FILE', str(names))
+    monkeypatch.setattr(script, 'STATE_TABLE_FILE', str(table))
+    # As if an older table had been imported at startup
+    monkeypatch.setattr(script, 'state_table_cache', (0, None))
+
+    abbreviations.write_text('IL\nTX', encoding='utf8')
+    names.write_text('Illinois\nTexas', encoding='utf8')
+    assert script.build_state_table() == 0
+    assert script.load_states() == [('IL', 'Illinois'), ('TX', 'Texas')]
+
+    abbreviations.write_text('IL\nTX\nZZ', encoding='utf8')
+    names.write_text('Illinois\nTexas\nZedland', encoding='utf8')
+    assert script.build_state_table() == 0
+    # Filesystems with coarse timestamps could give both tables the same time
+    os.utime(table, ns=(table.stat().st_atime_ns, table.stat().st_mtime_ns + 1))
+    states = script.load_states()
+    assert states == [('IL', 'Illinois'), ('TX', 'Texas'), ('ZZ', 'Zedland')]
+    assert script.prebuilt_patterns(tuple(states))[0] is not None
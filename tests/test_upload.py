@@ -0,0 +1,95 @@
+import hashlib
+import http.server
+import threading
+
+import pytest
+
+import script
+
+
+# Stand-in for Artifactory: answers each PUT with the next status in the list and keeps what it was sent
+class ArtifactoryHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.requests.append((self.path, dict(self.headers), body))
+        status = self.server.statuses.pop(0)
+        reply = b'{"errors": []}'
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def artifactory(monkeypatch):
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), ArtifactoryHandler)
+    server.requests = []
+    server.statuses = []
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    monkeypatch.setattr(script, 'ARTIFACTORY_URL', f'http://127.0.0.1:{server.server_port}/artifactory')
+    monkeypatch.setattr(script, 'ARTIFACTORY_TOKEN', 'secret')
+    monkeypatch.setattr(script, 'UPLOAD_BACKOFF', 0)
+    # Connections are kept per thread, a fresh one so nothing points at an earlier test's server
+    monkeypatch.setattr(script, 'upload_connections', threading.local())
+    yield server
+    script.artifactory_connection().close()
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def notes(write_notes):
+    return write_notes('Version: 1.2.3.4 01/02/2024\nFixed a bug\n' * 1000)
+
+
+# A checksum the server already has is deployed without sending the file
+def test_checksum_deploy_hit(artifactory, notes):
+    artifactory.statuses = [201]
+    assert script.upload_to_artifactory(notes, 'release-notes/MGMT-1/notes_1.2.3.4.txt') == 'deployed'
+    [(path, headers, body)] = artifactory.requests
+    assert path == '/artifactory/release-notes/MGMT-1/notes_1.2.3.4.txt'
+    assert headers['X-Checksum-Deploy'] == 'true'
+    assert headers['Authorization'] == 'Bearer secret'
+    assert body == b''
+
+
+# A 404 on the checksum deploy means the server doesn't have the content, the file is streamed with its checksums
+def test_upload_after_checksum_miss(artifactory, notes):
+    artifactory.statuses = [404, 201]
+    sent = []
+    assert script.upload_to_artifactory(notes, 'release-notes/MGMT-1/notes_1.2.3.4.txt', sent.append) == 'uploaded'
+    data = open(notes, 'rb').read()
+    (_, deploy_headers, _), (_, headers, body) = artifactory.requests
+    assert 'X-Checksum-Deploy' not in headers
+    assert headers['X-Checksum-Sha1'] == deploy_headers['X-Checksum-Sha1'] == hashlib.sha1(data).hexdigest()
+    assert headers['X-Checksum-Sha256'] == hashlib.sha256(data).hexdigest()
+    assert body == data
+    assert sent[-1] == len(data)
+
+
+# Server errors and throttling are retried, the whole checksum deploy and upload starts over
+def test_server_errors_are_retried(artifactory, notes):
+    artifactory.statuses = [503, 429, 404, 502, 404, 201]
+    assert script.upload_to_artifactory(notes, 'release-notes/MGMT-1/notes_1.2.3.4.txt') == 'uploaded'
+    assert [len(body) > 0 for _, _, body in artifactory.requests] == [False, False, False, True, False, True]
+
+
+def test_gives_up_after_retries(artifactory, notes):
+    artifactory.statuses = [500] * (script.UPLOAD_RETRIES + 1)
+    with pytest.raises(script.UploadError, match='HTTP 500'):
+        script.upload_to_artifactory(notes, 'release-notes/MGMT-1/notes_1.2.3.4.txt')
+    assert len(artifactory.requests) == script.UPLOAD_RETRIES + 1
+
+
+# Other client errors won't change on a retry
+def test_client_errors_are_not_retried(artifactory, notes):
+    artifactory.statuses = [403]
+    with pytest.raises(script.UploadError, match='HTTP 403'):
+        script.upload_to_artifactory(notes, 'release-notes/MGMT-1/notes_1.2.3.4.txt')
+    assert len(artifactory.requests) == 1